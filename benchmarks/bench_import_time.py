@@ -0,0 +1,181 @@
+"""Benchmark the time it takes to import the pe_detection packages and check
+that importing them does not load heavy dependencies.
+
+Each import is timed in a fresh interpreter. The script exits with status 1
+if the median import time of any package exceeds --max-ms, if a heavy
+dependency is loaded by a plain import or by looking up an attribute the
+package does not have (as hasattr and tab completion do), or if the names
+listed for a submodule in a package's __init__.py differ from the public
+names the submodule defines. It can be used to guard against regressions in
+the lazy imports set up in the packages' __init__.py files.
+
+Usage:
+    python benchmarks/bench_import_time.py [--repeat 5] [--max-ms 200]
+"""
+
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Set, Tuple
+
+PACKAGES = [
+    'pe_detection.tools',
+    'pe_detection.preprocessing',
+    'pe_detection.learn'
+]
+HEAVY_MODULES = [
+    'bs4',
+    'matplotlib',
+    'numpy',
+    'pandas',
+    'pyarrow',
+    'requests',
+    'sklearn',
+    'spacy'
+]
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIMING_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import {package}
+elapsed = time.perf_counter() - start
+loaded = [m for m in {heavy_modules!r} if m in sys.modules]
+hasattr({package}, 'nonexistent_name')
+print(json.dumps({{
+    'ms': elapsed * 1000,
+    'loaded': loaded,
+    'loaded_by_lookup': [
+        m for m in {heavy_modules!r} if m in sys.modules and m not in loaded
+    ],
+    'submodules': {package}._lazy_submodules
+}}))
+"""
+
+
+# ====================
+def time_import(package: str) -> Tuple[float, List[str], List[str], Dict[str, List[str]]]:
+    """Import a package in a fresh interpreter, then look up an attribute
+    that it does not have.
+
+    Args:
+      package (str):
+        The name of the package (e.g. 'pe_detection.tools')
+
+    Returns:
+      Tuple[float, List[str], List[str], Dict[str, List[str]]]:
+        The import time in milliseconds, the heavy modules that were loaded
+        by the import, the heavy modules that were loaded by the attribute
+        lookup, and the names listed for each submodule in the package's
+        __init__.py
+    """
+
+    env = {**os.environ, 'PYTHONPATH': REPO_ROOT}
+    result = subprocess.run(
+        [sys.executable, '-c', TIMING_CODE.format(
+            package=package, heavy_modules=HEAVY_MODULES
+        )],
+        capture_output=True, text=True, check=True, env=env
+    )
+    output = json.loads(result.stdout)
+    return (
+        output['ms'], output['loaded'], output['loaded_by_lookup'],
+        output['submodules']
+    )
+
+
+# ====================
+def defined_names(package: str, submodule: str) -> Set[str]:
+    """Get the public names defined at the top level of a submodule (functions,
+    classes and assigned variables, but not imported names), by parsing its
+    source so that nothing is imported.
+
+    Args:
+      package (str):
+        The name of the package (e.g. 'pe_detection.tools')
+      submodule (str):
+        The name of the submodule (e.g. 'df_helper')
+
+    Returns:
+      Set[str]:
+        The names
+    """
+
+    path = os.path.join(REPO_ROOT, *package.split('.'), f'{submodule}.py')
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    names = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Assign):
+            names.update(t.id for t in node.targets if isinstance(t, ast.Name))
+        elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+            names.add(node.target.id)
+    return {name for name in names if not name.startswith('_')}
+
+
+# ====================
+def name_list_mismatches(package: str,
+                         submodules: Dict[str, List[str]]) -> List[str]:
+    """Compare the names listed for each submodule in a package's
+    __init__.py with the public names the submodule defines.
+
+    Args:
+      package (str):
+        The name of the package
+      submodules (Dict[str, List[str]]):
+        The names listed for each submodule (see time_import)
+
+    Returns:
+      List[str]:
+        A description of each submodule whose list differs
+    """
+
+    mismatches = []
+    for submodule, listed in submodules.items():
+        defined = defined_names(package, submodule)
+        missing = sorted(defined - set(listed))
+        extra = sorted(set(listed) - defined)
+        if missing or extra:
+            mismatches.append(
+                f"{package}.{submodule}: not listed {missing}, " + \
+                f"listed but not defined {extra}"
+            )
+    return mismatches
+
+
+# ====================
+def main() -> int:
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of fresh imports per package')
+    parser.add_argument('--max-ms', type=float, default=200.0,
+                        help='Maximum allowed median import time in ms')
+    args = parser.parse_args()
+    failed = False
+    for package in PACKAGES:
+        runs = [time_import(package) for _ in range(args.repeat)]
+        median_ms = statistics.median(run[0] for run in runs)
+        loaded = sorted(set(m for run in runs for m in run[1]))
+        loaded_by_lookup = sorted(set(m for run in runs for m in run[2]))
+        mismatches = name_list_mismatches(package, runs[0][3])
+        status = 'ok'
+        if median_ms > args.max_ms or loaded or loaded_by_lookup or mismatches:
+            status = 'FAIL'
+            failed = True
+        print(f"{package:<30} {median_ms:8.1f} ms  " + \
+              f"heavy modules loaded: {loaded or 'none'}, " + \
+              f"by missing attribute: {loaded_by_lookup or 'none'}  {status}")
+        for mismatch in mismatches:
+            print(f"  {mismatch}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2 @@
+# Having a conftest.py in the repository root makes pytest put the root on
+# sys.path, so that the tests import pe_detection from the working tree
@@ -1,2 +1,35 @@
-from pe_detection.learn.classifier import *
-from pe_detection.learn.selection import *
+# Submodules are imported on first use of one of their names, so that
+# importing pe_detection.learn does not load scikit-learn
+# (see pe_detection/tools/lazy_import.py)
+from pe_detection.tools.lazy_import import lazy_package
+
+lazy_package(__name__, {
+    'featurizers': [
+        'whitespace_tokenizer', 'word_ngrams', 'whitespace_ngrams',
+        'WhitespaceCountVectorizer'
+    ],
+    'feature_cache': [
+        'DEFAULT_MAX_CACHE_BYTES', 'CSR_PARTS', 'texts_fingerprint',
+        'tfidf_featurizer', 'FeatureCache', 'featurize'
+    ],
+    'classifier': [
+        'train_tfidf_count_clf', 'train_tfidf_count_clfs', 'compare_clfs',
+        'evaluate_clf'
+    ],
+    'cross_validation': [
+        'doc_term_counts', 'tfidf_rows', 'fold_accuracy', 'cross_validate_clf'
+    ],
+    'streaming': [
+        'DEFAULT_N_FEATURES', 'hashing_vectorizer',
+        'IncrementalTfidfTransformer', 'iter_xy_chunks', 'train_streaming_clf'
+    ],
+    'grid': [
+        'GRID_CORPORA', 'GRID_PARAS', 'GridJob', 'expand_grid',
+        'init_grid_worker', 'get_grid_paras', 'run_grid_job',
+        'grid_job_settings', 'failed_grid_row', 'run_grid', 'write_grid_row'
+    ],
+    'selection': [
+        'get_single_best', 'get_metrics_df', 'get_votes_df',
+        'ensemble_name_to_model_list'
+    ],
+})
@@ -1,10 +1,15 @@
-from typing import Any, Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.feature_extraction.text import TfidfTransformer
 from sklearn.metrics import accuracy_score
 from sklearn.pipeline import Pipeline
 
+from pe_detection.learn.feature_cache import FeatureCache, featurize
+from pe_detection.learn.featurizers import WhitespaceCountVectorizer
+
 
 # ====================
 def train_tfidf_count_clf(train_df: pd.DataFrame,
@@ -15,15 +20,7 @@ def train_tfidf_count_clf(train_df: pd.DataFrame,
                           ) -> Pipeline:
 
     text_clf = Pipeline([
-        (
-            'vect',
-            CountVectorizer(
-                strip_accents=False,
-                lowercase=False,
-                tokenizer=lambda text: text.split(),
-                ngram_range=ngram_range
-            )
-        ),
+        ('vect', WhitespaceCountVectorizer(ngram_range=ngram_range)),
         ('tfidf', TfidfTransformer()),
         ('clf', model)
     ])
@@ -31,6 +28,112 @@ def train_tfidf_count_clf(train_df: pd.DataFrame,
     return text_clf
 
 
+# ====================
+def train_tfidf_count_clfs(train_df: pd.DataFrame,
+                           models: Dict[str, Any],
+                           x_label: Optional[str] = 'x',
+                           y_label: Optional[str] = 'y',
+                           ngram_range: Optional[Tuple[int, int]] = (1, 1),
+                           n_jobs: Optional[int] = None,
+                           cache: Optional[FeatureCache] = None
+                           ) -> Dict[str, Pipeline]:
+    """Train several models on the same TF-IDF features, fitting the
+    featurizer only once and the models in parallel.
+
+    Args:
+      train_df (pd.DataFrame):
+        The training data
+      models (Dict[str, Any]):
+        A mapping of model names to unfitted scikit-learn estimators
+        (e.g. {'naive_bayes': MultinomialNB(), 'svm': LinearSVC()}).
+        The estimators are cloned, so they are not modified.
+      x_label (Optional[str], optional):
+        The label of the text column. Defaults to 'x'.
+      y_label (Optional[str], optional):
+        The label of the class label column. Defaults to 'y'.
+      ngram_range (Optional[Tuple[int, int]], optional):
+        The range of word n-grams to use as features. Defaults to (1, 1).
+      n_jobs (Optional[int], optional):
+        The number of models to fit at the same time, following the joblib
+        convention (None for 1, -1 for all CPUs). Defaults to None.
+      cache (Optional[FeatureCache], optional):
+        A cache of fitted featurizers and feature matrices (see
+        feature_cache.featurize). Defaults to None.
+
+    Returns:
+      Dict[str, Pipeline]:
+        A fitted pipeline for each model, equivalent to the one returned by
+        train_tfidf_count_clf. The pipelines share the same fitted 'vect'
+        and 'tfidf' steps.
+    """
+
+    featurizer, X, _ = featurize(
+        train_df[x_label], ngram_range=ngram_range, cache=cache, x_label=x_label
+    )
+    y = train_df[y_label]
+    fitted = Parallel(n_jobs=n_jobs)(
+        delayed(clone(model).fit)(X, y) for model in models.values()
+    )
+    return {
+        name: Pipeline(featurizer.steps + [('clf', model)])
+        for name, model in zip(models.keys(), fitted)
+    }
+
+
+# ====================
+def compare_clfs(train_df: pd.DataFrame,
+                 test_df: pd.DataFrame,
+                 models: Dict[str, Any],
+                 x_label: Optional[str] = 'x',
+                 y_label: Optional[str] = 'y',
+                 ngram_range: Optional[Tuple[int, int]] = (1, 1),
+                 n_jobs: Optional[int] = None,
+                 cache: Optional[FeatureCache] = None) -> pd.DataFrame:
+    """Train several models on the same TF-IDF features and get their
+    predictions for the test set. The training and test texts are featurized
+    only once (or loaded from cache), so comparing N models costs one
+    featurization plus N fits.
+
+    Args:
+      train_df (pd.DataFrame):
+        The training data
+      test_df (pd.DataFrame):
+        The test data
+      models (Dict[str, Any]):
+        A mapping of model names to unfitted scikit-learn estimators
+        (see train_tfidf_count_clfs)
+      x_label (Optional[str], optional):
+        The label of the text column. Defaults to 'x'.
+      y_label (Optional[str], optional):
+        The label of the class label column. Defaults to 'y'.
+      ngram_range (Optional[Tuple[int, int]], optional):
+        The range of word n-grams to use as features. Defaults to (1, 1).
+      n_jobs (Optional[int], optional):
+        The number of models to fit at the same time (see
+        train_tfidf_count_clfs). Defaults to None.
+      cache (Optional[FeatureCache], optional):
+        A cache of fitted featurizers and feature matrices.
+        Defaults to None.
+
+    Returns:
+      pd.DataFrame:
+        A DataFrame of predictions with a 'y_true' column and a column for
+        each model, as used by selection.get_metrics_df
+    """
+
+    _, X_train, X_test = featurize(
+        train_df[x_label], test_df[x_label], ngram_range, cache, x_label
+    )
+    y = train_df[y_label]
+    fitted = Parallel(n_jobs=n_jobs)(
+        delayed(clone(model).fit)(X_train, y) for model in models.values()
+    )
+    predictions = {
+        name: model.predict(X_test) for name, model in zip(models.keys(), fitted)
+    }
+    return pd.DataFrame({'y_true': test_df[y_label].to_numpy(), **predictions})
+
+
 # ====================
 def evaluate_clf(model: Pipeline,
                  test_df: pd.DataFrame,
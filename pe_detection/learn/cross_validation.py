@@ -0,0 +1,191 @@
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.preprocessing import normalize
+
+from pe_detection.learn.featurizers import WhitespaceCountVectorizer
+from pe_detection.tools.train_test_split import folds
+
+
+# ====================
+def doc_term_counts(xy_df: pd.DataFrame,
+                    x_label: str = 'x',
+                    doc_label: str = 'doc_idx',
+                    ngram_range: Tuple[int, int] = (1, 1)
+                    ) -> Tuple[sp.csr_matrix, sp.csr_matrix, np.ndarray]:
+    """Count terms in every paragraph once, and count the paragraphs that
+    contain each term in each document, so that the training statistics of
+    any fold can be derived by subtraction instead of refitting.
+
+    Args:
+      xy_df (pd.DataFrame):
+        A DataFrame with a row for each paragraph (e.g. the output of
+        paras_df_to_xy_df with the doc_idx column kept)
+      x_label (str, optional):
+        The label of the text column. Defaults to 'x'.
+      doc_label (str, optional):
+        The label of the document index column. Defaults to 'doc_idx'.
+      ngram_range (Tuple[int, int], optional):
+        The range of word n-grams to use as features. Defaults to (1, 1).
+
+    Returns:
+      Tuple[sp.csr_matrix, sp.csr_matrix, np.ndarray]:
+        The term counts of each paragraph, the document frequencies of each
+        term in each document (a row for each document), and the document
+        of each row of that matrix
+    """
+
+    counts = WhitespaceCountVectorizer(ngram_range=ngram_range).fit_transform(
+        xy_df[x_label]
+    )
+    counts = sp.csr_matrix(counts)
+    doc_codes, docs = pd.factorize(xy_df[doc_label], sort=True)
+    membership = sp.csr_matrix(
+        (np.ones(len(doc_codes), dtype=np.int64), (doc_codes, np.arange(len(doc_codes)))),
+        shape=(len(docs), len(doc_codes))
+    )
+    presence = counts.copy()
+    presence.data = np.ones_like(presence.data)
+    doc_dfs = sp.csr_matrix(membership @ presence)
+    return counts, doc_dfs, np.asarray(docs)
+
+
+# ====================
+def tfidf_rows(counts: sp.csr_matrix,
+               idf: np.ndarray) -> sp.csr_matrix:
+    """Weight term counts by IDF and normalize each row to unit L2 norm, as
+    TfidfTransformer does with its default options.
+
+    Args:
+      counts (sp.csr_matrix):
+        The term counts
+      idf (np.ndarray):
+        The IDF of each column
+
+    Returns:
+      sp.csr_matrix:
+        The TF-IDF matrix
+    """
+
+    X = sp.csr_matrix(counts, dtype=np.float64, copy=True)
+    X.data *= idf[X.indices]
+    return normalize(X, norm='l2', copy=False)
+
+
+# ====================
+def fold_accuracy(model: Any,
+                  counts: sp.csr_matrix,
+                  y: np.ndarray,
+                  train_rows: np.ndarray,
+                  test_rows: np.ndarray,
+                  train_dfs: np.ndarray) -> float:
+    """Train a model on one fold from precomputed term counts and get its
+    accuracy on the held-out rows.
+
+    Args:
+      model (Any):
+        An unfitted scikit-learn estimator
+      counts (sp.csr_matrix):
+        The term counts of every paragraph (see doc_term_counts)
+      y (np.ndarray):
+        The class label of every paragraph
+      train_rows (np.ndarray):
+        A boolean mask of the training rows
+      test_rows (np.ndarray):
+        A boolean mask of the test rows
+      train_dfs (np.ndarray):
+        The document frequency of each term in the training rows
+
+    Returns:
+      float:
+        The accuracy
+    """
+
+    # Terms that do not occur in the training rows would not be in the
+    # vocabulary of a vectorizer fitted on them
+    vocab = np.flatnonzero(train_dfs)
+    num_train = int(train_rows.sum())
+    idf = np.log((1 + num_train) / (1 + train_dfs[vocab])) + 1
+    X_train = tfidf_rows(counts[train_rows][:, vocab], idf)
+    X_test = tfidf_rows(counts[test_rows][:, vocab], idf)
+    model = clone(model).fit(X_train, y[train_rows])
+    return accuracy_score(y[test_rows], model.predict(X_test))
+
+
+# ====================
+def cross_validate_clf(xy_df: pd.DataFrame,
+                       model: Any,
+                       fold_docs: Optional[List[Tuple[list, list]]] = None,
+                       x_label: str = 'x',
+                       y_label: str = 'y',
+                       doc_label: str = 'doc_idx',
+                       ngram_range: Tuple[int, int] = (1, 1),
+                       n_jobs: Optional[int] = None) -> pd.Series:
+    """Cross-validate a TF-IDF classifier over folds of documents, giving the
+    same accuracies as fitting train_tfidf_count_clf on the training
+    documents of each fold and evaluating it on the test documents.
+
+    Paragraphs are featurized once. The document frequencies of each fold's
+    training set are the totals over all documents minus those of the
+    held-out documents, and terms that only occur in the held-out documents
+    are dropped, as they would not be in a refitted vocabulary.
+
+    Args:
+      xy_df (pd.DataFrame):
+        A DataFrame with a row for each paragraph and columns for texts,
+        class labels and document indices
+      model (Any):
+        An unfitted scikit-learn estimator (cloned for each fold)
+      fold_docs (Optional[List[Tuple[list, list]]], optional):
+        The training and test documents of each fold (e.g. the output of
+        train_test_split.balanced_folds). Defaults to None (leave one
+        document out, see train_test_split.folds).
+      x_label (str, optional):
+        The label of the text column. Defaults to 'x'.
+      y_label (str, optional):
+        The label of the class label column. Defaults to 'y'.
+      doc_label (str, optional):
+        The label of the document index column. Defaults to 'doc_idx'.
+      ngram_range (Tuple[int, int], optional):
+        The range of word n-grams to use as features. Defaults to (1, 1).
+      n_jobs (Optional[int], optional):
+        The number of folds to run at the same time, following the joblib
+        convention (None for 1, -1 for all CPUs). Defaults to None.
+
+    Returns:
+      pd.Series:
+        The accuracy of each fold, indexed by fold number
+    """
+
+    counts, doc_dfs, docs = doc_term_counts(xy_df, x_label, doc_label, ngram_range)
+    if fold_docs is None:
+        fold_docs = folds(list(docs))
+    doc_rows = {doc: i for i, doc in enumerate(docs)}
+    row_docs = xy_df[doc_label].to_numpy()
+    y = xy_df[y_label].to_numpy()
+    total_dfs = np.asarray(doc_dfs.sum(axis=0)).ravel()
+    jobs = []
+    for fold in fold_docs:
+        train_docs, test_docs = fold[0], fold[1]
+        if len(train_docs) + len(test_docs) == len(docs):
+            test_doc_rows = [doc_rows[doc] for doc in test_docs]
+            train_dfs = total_dfs - np.asarray(doc_dfs[test_doc_rows].sum(axis=0)).ravel()
+        else:
+            # Some documents are in neither set
+            train_doc_rows = [doc_rows[doc] for doc in train_docs]
+            train_dfs = np.asarray(doc_dfs[train_doc_rows].sum(axis=0)).ravel()
+        jobs.append(delayed(fold_accuracy)(
+            model,
+            counts,
+            y,
+            np.isin(row_docs, train_docs),
+            np.isin(row_docs, test_docs),
+            train_dfs
+        ))
+    accuracies = Parallel(n_jobs=n_jobs)(jobs)
+    return pd.Series(accuracies, name='accuracy')
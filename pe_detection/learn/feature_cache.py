@@ -0,0 +1,304 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+import sklearn
+from sklearn.feature_extraction.text import TfidfTransformer
+from sklearn.pipeline import Pipeline
+
+from pe_detection.learn.featurizers import WhitespaceCountVectorizer
+from pe_detection.tools.dir_cache import DirectoryCache
+
+DEFAULT_MAX_CACHE_BYTES = 4 * 1024 ** 3
+CSR_PARTS = ['data', 'indices', 'indptr']
+
+
+# ====================
+def texts_fingerprint(texts: Iterable[str]) -> str:
+    """Get a hash of a sequence of texts that changes if any text, or the
+    selection or order of the texts, changes.
+
+    Args:
+      texts (Iterable[str]):
+        The texts
+
+    Returns:
+      str:
+        The SHA-256 hex digest
+    """
+
+    h = hashlib.sha256()
+    num_texts = 0
+    for text in texts:
+        h.update(text.encode('utf-8', 'surrogatepass'))
+        h.update(b'\x00')
+        num_texts += 1
+    h.update(str(num_texts).encode('ascii'))
+    return h.hexdigest()
+
+
+# ====================
+def tfidf_featurizer(ngram_range: Tuple[int, int] = (1, 1)) -> Pipeline:
+    """Get an unfitted featurizer equivalent to the 'vect' and 'tfidf' steps
+    of the pipelines returned by train_tfidf_count_clf.
+
+    Args:
+      ngram_range (Tuple[int, int], optional):
+        The range of word n-grams to use as features. Defaults to (1, 1).
+
+    Returns:
+      Pipeline:
+        The featurizer
+    """
+
+    return Pipeline([
+        ('vect', WhitespaceCountVectorizer(ngram_range=ngram_range)),
+        ('tfidf', TfidfTransformer())
+    ])
+
+
+# ====================
+class FeatureCache(DirectoryCache):
+    """A directory of fitted featurizers and the TF-IDF matrices they produce
+    for training and test texts, so that comparing several classifiers on
+    the same data only requires featurizing it once, including across
+    processes and sessions.
+
+    Each entry is a subdirectory named after a hash of the featurizer
+    configuration, the scikit-learn and numpy versions, and fingerprints of
+    the training and test texts. It
+    contains the pickled fitted featurizer and, for each matrix, the data,
+    indices and indptr arrays of its CSR representation as separate .npy
+    files, which are memory-mapped when the entry is loaded (arrays in .npz
+    archives cannot be memory-mapped). The modification time of the entry
+    directory records when it was last used, and least recently used
+    entries are evicted once the cache exceeds max_bytes.
+
+    Args:
+      cache_dir (str):
+        The path to the cache directory. Created if it does not exist.
+      max_bytes (int, optional):
+        The maximum total size of cached entries in bytes.
+        Defaults to DEFAULT_MAX_CACHE_BYTES (4 GiB).
+    """
+
+    def __init__(self,
+                 cache_dir: str,
+                 max_bytes: int = DEFAULT_MAX_CACHE_BYTES):
+
+        super().__init__(cache_dir, max_bytes)
+
+    # ====================
+    @staticmethod
+    def key(featurizer: Pipeline,
+            train_fingerprint: str,
+            test_fingerprint: Optional[str] = None,
+            x_label: Optional[str] = None) -> str:
+        """Get the cache key for a featurizer configuration and data.
+
+        Args:
+          featurizer (Pipeline):
+            The unfitted featurizer, whose parameters (e.g. ngram_range) are
+            part of the key
+          train_fingerprint (str):
+            The fingerprint of the training texts (see texts_fingerprint)
+          test_fingerprint (Optional[str], optional):
+            The fingerprint of the test texts. Defaults to None.
+          x_label (Optional[str], optional):
+            The label of the text column. Defaults to None.
+
+        Returns:
+          str:
+            The key
+        """
+
+        config = {
+            'featurizer': repr(featurizer),
+            'params': {
+                name: repr(step.get_params()) for name, step in featurizer.steps
+            },
+            'x_label': x_label,
+            # Pickled featurizers are not portable across library versions
+            'versions': {'sklearn': sklearn.__version__, 'numpy': np.__version__},
+            'train': train_fingerprint,
+            'test': test_fingerprint
+        }
+        return hashlib.sha256(
+            json.dumps(config, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
+    # ====================
+    def get(self, key: str) -> Optional[Tuple[Pipeline, sp.csr_matrix, Optional[sp.csr_matrix]]]:
+        """Load a cached entry, marking it as recently used.
+
+        Args:
+          key (str):
+            The key (see key)
+
+        Returns:
+          Optional[Tuple[Pipeline, sp.csr_matrix, Optional[sp.csr_matrix]]]:
+            The fitted featurizer and the memory-mapped training and test
+            matrices (None if no test texts were cached), or None if the key
+            is not in the cache or its entry cannot be loaded
+        """
+
+        entry_dir = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(entry_dir):
+            return None
+        try:
+            with open(os.path.join(entry_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(os.path.join(entry_dir, 'featurizer.pkl'), 'rb') as f:
+                featurizer = pickle.load(f)
+            matrices = [
+                self._load_csr(entry_dir, name, meta[name]) if name in meta else None
+                for name in ['train', 'test']
+            ]
+            os.utime(entry_dir, None)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError,
+                ImportError, EOFError, pickle.UnpicklingError):
+            # A truncated entry, or one that cannot be unpickled (e.g. written
+            # by another version of a library) is removed and treated as a miss
+            self._remove_entry(entry_dir)
+            return None
+        return featurizer, matrices[0], matrices[1]
+
+    # ====================
+    def put(self,
+            key: str,
+            featurizer: Pipeline,
+            X_train: sp.csr_matrix,
+            X_test: Optional[sp.csr_matrix] = None):
+        """Add an entry to the cache, then evict least recently used entries
+        until the cache fits in max_bytes.
+
+        Args:
+          key (str):
+            The key (see key)
+          featurizer (Pipeline):
+            The fitted featurizer
+          X_train (sp.csr_matrix):
+            The features of the training texts
+          X_test (Optional[sp.csr_matrix], optional):
+            The features of the test texts. Defaults to None.
+        """
+
+        entry_dir = os.path.join(self.cache_dir, key)
+        tmp_dir = entry_dir + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        os.makedirs(tmp_dir, exist_ok=True)
+        with open(os.path.join(tmp_dir, 'featurizer.pkl'), 'wb') as f:
+            pickle.dump(featurizer, f, protocol=pickle.HIGHEST_PROTOCOL)
+        meta = {'created_at': time.time()}
+        for name, X in [('train', X_train), ('test', X_test)]:
+            if X is not None:
+                meta[name] = self._save_csr(tmp_dir, name, X)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # Another process added the same entry first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    # ====================
+    @staticmethod
+    def _save_csr(entry_dir: str, name: str, X: sp.spmatrix) -> list:
+
+        X = sp.csr_matrix(X)
+        for part in CSR_PARTS:
+            np.save(os.path.join(entry_dir, f'{name}.{part}.npy'), getattr(X, part))
+        return list(X.shape)
+
+    # ====================
+    @staticmethod
+    def _load_csr(entry_dir: str, name: str, shape: list) -> sp.csr_matrix:
+
+        data, indices, indptr = [
+            np.load(os.path.join(entry_dir, f'{name}.{part}.npy'), mmap_mode='r')
+            for part in CSR_PARTS
+        ]
+        return sp.csr_matrix((data, indices, indptr), shape=tuple(shape), copy=False)
+
+    # ====================
+    def _entry_paths(self) -> List[str]:
+
+        return [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if not name.endswith('.tmp')
+            and os.path.isdir(os.path.join(self.cache_dir, name))
+        ]
+
+    # ====================
+    def _entry_size(self, path: str) -> int:
+
+        return sum(
+            os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)
+        )
+
+    # ====================
+    def _remove_entry(self, path: str):
+
+        shutil.rmtree(path, ignore_errors=True)
+
+
+# ====================
+def featurize(train_texts: Iterable[str],
+              test_texts: Optional[Iterable[str]] = None,
+              ngram_range: Tuple[int, int] = (1, 1),
+              cache: Optional[FeatureCache] = None,
+              x_label: Optional[str] = None
+              ) -> Tuple[Pipeline, sp.csr_matrix, Optional[sp.csr_matrix]]:
+    """Fit a TF-IDF featurizer (see tfidf_featurizer) on training texts and
+    transform the training and test texts, or load the results from a
+    FeatureCache if the same texts have been featurized with the same
+    configuration before.
+
+    Args:
+      train_texts (Iterable[str]):
+        The training texts
+      test_texts (Optional[Iterable[str]], optional):
+        The test texts. Defaults to None.
+      ngram_range (Tuple[int, int], optional):
+        The range of word n-grams to use as features. Defaults to (1, 1).
+      cache (Optional[FeatureCache], optional):
+        The cache. Defaults to None (no caching).
+      x_label (Optional[str], optional):
+        The label of the text column, included in the cache key.
+        Defaults to None.
+
+    Returns:
+      Tuple[Pipeline, sp.csr_matrix, Optional[sp.csr_matrix]]:
+        The fitted featurizer and the training and test matrices
+        (None if test_texts is None)
+    """
+
+    featurizer = tfidf_featurizer(ngram_range)
+    if cache is not None:
+        if not isinstance(train_texts, (list, np.ndarray)):
+            train_texts = list(train_texts)
+        if test_texts is not None and not isinstance(test_texts, (list, np.ndarray)):
+            test_texts = list(test_texts)
+        key = FeatureCache.key(
+            featurizer,
+            texts_fingerprint(train_texts),
+            texts_fingerprint(test_texts) if test_texts is not None else None,
+            x_label
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    X_train = featurizer.fit_transform(train_texts)
+    X_test = featurizer.transform(test_texts) if test_texts is not None else None
+    if cache is not None:
+        cache.put(key, featurizer, X_train, X_test)
+    return featurizer, X_train, X_test
@@ -0,0 +1,137 @@
+from functools import partial
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+
+# ====================
+def whitespace_tokenizer(text: str) -> List[str]:
+    """Split a text into tokens on whitespace. Defined at module level (unlike
+    a lambda) so that vectorizers and pipelines that use it can be pickled.
+
+    Args:
+      text (str):
+        The text (e.g. 'Hello , world !')
+
+    Returns:
+      List[str]:
+        The tokens (e.g. ['Hello', ',', 'world', '!'])
+    """
+
+    return text.split()
+
+
+# ====================
+def word_ngrams(tokens: List[str], min_n: int, max_n: int) -> List[str]:
+    """Get the space-joined word n-grams of a list of tokens for each n in a
+    range, as CountVectorizer does.
+
+    Args:
+      tokens (List[str]):
+        The tokens
+      min_n (int):
+        The smallest n
+      max_n (int):
+        The largest n
+
+    Returns:
+      List[str]:
+        The n-grams
+    """
+
+    if max_n == 1:
+        return tokens
+    ngrams = list(tokens) if min_n == 1 else []
+    for n in range(max(min_n, 2), max_n + 1):
+        ngrams.extend(map(' '.join, zip(*[tokens[i:] for i in range(n)])))
+    return ngrams
+
+
+# ====================
+def whitespace_ngrams(text: str, min_n: int = 1, max_n: int = 1) -> List[str]:
+    """Split a text into tokens on whitespace and get its word n-grams (see
+    word_ngrams). Used as the analyzer of WhitespaceCountVectorizer, with
+    min_n and max_n bound by functools.partial so that it can be pickled.
+
+    Args:
+      text (str):
+        The text
+      min_n (int, optional):
+        The smallest n. Defaults to 1.
+      max_n (int, optional):
+        The largest n. Defaults to 1.
+
+    Returns:
+      List[str]:
+        The n-grams
+    """
+
+    return word_ngrams(text.split(), min_n, max_n)
+
+
+# ====================
+class WhitespaceCountVectorizer(CountVectorizer):
+    """A CountVectorizer that splits texts into tokens on whitespace without
+    lowercasing or other preprocessing, equivalent to
+    CountVectorizer(lowercase=False, tokenizer=lambda text: text.split())
+    but picklable, and faster because n-grams are built with one call to
+    whitespace_ngrams per text instead of sklearn's chain of preprocessor,
+    tokenizer and n-gram functions.
+
+    Only the public build_analyzer method is overridden, so vocabulary
+    building, min_df/max_df/max_features and feature sorting are left to
+    CountVectorizer.
+
+    Args:
+      ngram_range (Tuple[int, int], optional):
+        The smallest and largest n of the word n-grams to count.
+        Defaults to (1, 1).
+      max_df (float, optional):
+        See CountVectorizer. Defaults to 1.0.
+      min_df (float, optional):
+        See CountVectorizer. Defaults to 1.
+      max_features (Optional[int], optional):
+        See CountVectorizer. Defaults to None.
+      vocabulary (optional):
+        See CountVectorizer. Defaults to None.
+      binary (bool, optional):
+        See CountVectorizer. Defaults to False.
+      dtype (optional):
+        See CountVectorizer. Defaults to np.int64.
+    """
+
+    def __init__(self,
+                 *,
+                 ngram_range: Tuple[int, int] = (1, 1),
+                 max_df: float = 1.0,
+                 min_df: float = 1,
+                 max_features: Optional[int] = None,
+                 vocabulary=None,
+                 binary: bool = False,
+                 dtype=np.int64):
+
+        super().__init__(
+            lowercase=False,
+            tokenizer=whitespace_tokenizer,
+            token_pattern=None,
+            ngram_range=ngram_range,
+            max_df=max_df,
+            min_df=min_df,
+            max_features=max_features,
+            vocabulary=vocabulary,
+            binary=binary,
+            dtype=dtype
+        )
+
+    # ====================
+    def build_analyzer(self) -> Callable[[str], List[str]]:
+        """Get the function that turns a text into the n-grams to count.
+
+        Returns:
+          Callable[[str], List[str]]:
+            whitespace_ngrams with this vectorizer's ngram_range
+        """
+
+        min_n, max_n = self.ngram_range
+        return partial(whitespace_ngrams, min_n=min_n, max_n=max_n)
@@ -0,0 +1,353 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pe_detection.learn.cross_validation import cross_validate_clf
+from pe_detection.tools.column_name_helper import get_column_name
+from pe_detection.tools.df_helper import (add_token_count_cols, sents_df_to_paras_df,
+                                         token_count_col_label)
+from pe_detection.tools.label_paras import add_para_labels
+from pe_detection.tools.misc_helper import get_n_jobs
+from pe_detection.tools.train_test_split import balanced_folds, get_doc_token_counts
+from pe_detection.tools.transform_data import get_cols_to_classes, paras_df_to_xy_df
+
+# Sentence-level corpora for each language pair and paragraph-level
+# DataFrames already built from them, held by each worker process
+GRID_CORPORA = {}
+GRID_PARAS = {}
+
+
+# ====================
+class GridJob(NamedTuple):
+    """A single experiment in a grid (see expand_grid).
+
+    Attributes:
+      language_pair (str):
+        E.g. 'en-de'
+      system_set (str):
+        The name of the set of systems and labels
+      systems_to_labels (Dict[str, str]):
+        The class label for each system (e.g. {'ht': 'ht', 'penmt1': 'pe'})
+      preprocessing_steps (str):
+        E.g. 'norm', 'norm.tok' or 'norm.tok.pos'
+      ngram_range (Tuple[int, int]):
+        The range of word n-grams to use as features
+      min_len (int):
+        The minimum number of tokens per pseudo-paragraph
+      model_name (str):
+        The name of the model
+    """
+
+    language_pair: str
+    system_set: str
+    systems_to_labels: Dict[str, str]
+    preprocessing_steps: str
+    ngram_range: Tuple[int, int]
+    min_len: int
+    model_name: str
+
+
+# ====================
+def expand_grid(spec: Dict[str, Any]) -> List[GridJob]:
+    """Expand a grid specification into a list of independent jobs, one for
+    every combination of its values.
+
+    Args:
+      spec (Dict[str, Any]):
+        A dictionary with the following keys:
+          'language_pairs': e.g. ['en-de', 'en-fr']
+          'system_sets': a mapping of names to mappings of systems to
+            class labels, e.g. {'penmt1': {'ht': 'ht', 'penmt1': 'pe'}}
+          'preprocessing_steps': e.g. ['norm', 'norm.tok']
+          'ngram_ranges': e.g. [(1, 1), (1, 2)]
+          'min_lens': e.g. [100]
+          'models': a mapping of names to unfitted scikit-learn
+            estimators, e.g. {'naive_bayes': MultinomialNB()}
+
+    Returns:
+      List[GridJob]:
+        The jobs, ordered so that jobs that use the same paragraphs are
+        next to each other
+    """
+
+    return [
+        GridJob(lp, set_name, spec['system_sets'][set_name], steps,
+                tuple(ngram_range), min_len, model_name)
+        for lp, steps, min_len, set_name, ngram_range, model_name in product(
+            spec['language_pairs'],
+            spec['preprocessing_steps'],
+            spec['min_lens'],
+            spec['system_sets'],
+            spec['ngram_ranges'],
+            spec['models']
+        )
+    ]
+
+
+# ====================
+def init_grid_worker(corpora: Dict[str, pd.DataFrame]):
+    """Store the corpora in a worker process, so that they are sent to each
+    worker once rather than with every job.
+
+    Args:
+      corpora (Dict[str, pd.DataFrame]):
+        A sentence-level DataFrame for each language pair, with a column for
+        each system and preprocessing step named as in get_column_name and
+        a 'doc_idx' column
+    """
+
+    GRID_CORPORA.clear()
+    # Shallow copies, so that token count columns added by get_grid_paras do
+    # not change the caller's DataFrames
+    GRID_CORPORA.update({
+        language_pair: corpus.copy(deep=False)
+        for language_pair, corpus in corpora.items()
+    })
+    GRID_PARAS.clear()
+
+
+# ====================
+def get_grid_paras(language_pair: str,
+                   preprocessing_steps: str,
+                   para_col_label: str,
+                   min_len: int) -> pd.DataFrame:
+    """Get pseudo-paragraphs of at least min_len tokens from the columns of
+    the corpus for a language pair with the given preprocessing steps,
+    building them only once per worker, so that jobs for different system
+    sets, ngram ranges and models share them. The paragraphs include the
+    token count column of para_col_label (see add_token_count_cols).
+
+    Args:
+      language_pair (str):
+        The language pair
+      preprocessing_steps (str):
+        The preprocessing steps of the text columns to keep
+      para_col_label (str):
+        The label of the column whose token counts determine the paragraphs
+      min_len (int):
+        The minimum number of tokens per pseudo-paragraph
+
+    Returns:
+      pd.DataFrame:
+        A DataFrame with a row for each pseudo-paragraph
+    """
+
+    key = (language_pair, preprocessing_steps, para_col_label, min_len)
+    if key not in GRID_PARAS:
+        corpus = GRID_CORPORA[language_pair]
+        count_col_label = token_count_col_label(para_col_label)
+        if count_col_label not in corpus.columns:
+            # Count tokens once per corpus. The counts are reused for every
+            # min_len, and summed into the paragraphs for balanced_folds.
+            add_token_count_cols(corpus, para_col_label)
+        cols = [
+            col for col in corpus.columns
+            if col.endswith(f'.{preprocessing_steps}')
+            or col in ['doc_idx', count_col_label]
+        ]
+        sents_df = add_para_labels(corpus[cols].copy(), para_col_label, min_len)
+        GRID_PARAS[key] = sents_df_to_paras_df(sents_df)
+    return GRID_PARAS[key]
+
+
+# ====================
+def run_grid_job(job: GridJob,
+                 model: Any,
+                 dataset: str,
+                 para_system: str,
+                 num_folds: int) -> dict:
+    """Run a single experiment: split the corpus into pseudo-paragraphs,
+    assign documents to folds balanced by token count, and cross-validate
+    the model.
+
+    Args:
+      job (GridJob):
+        The job
+      model (Any):
+        The unfitted scikit-learn estimator
+      dataset (str):
+        The dataset part of the column names (e.g. 'ted')
+      para_system (str):
+        The system whose token counts determine the pseudo-paragraphs
+        and folds
+      num_folds (int):
+        The number of folds
+
+    Returns:
+      dict:
+        A result row with the job's settings, the accuracy for each fold
+        (keys 0 to num_folds - 1), the mean accuracy, and an 'error'
+        column that is None (see failed_grid_row)
+    """
+
+    cols_to_classes = get_cols_to_classes(
+        dataset,
+        job.language_pair,
+        job.preprocessing_steps,
+        list(job.systems_to_labels.keys()),
+        list(job.systems_to_labels.values())
+    )
+    para_col_label = get_column_name(
+        job.language_pair, para_system, job.preprocessing_steps, dataset
+    )
+    paras_df = get_grid_paras(
+        job.language_pair, job.preprocessing_steps, para_col_label, job.min_len
+    )
+    fold_docs = balanced_folds(
+        get_doc_token_counts(paras_df, para_col_label), num_folds
+    )
+    xy_df = paras_df_to_xy_df(paras_df, cols_to_classes, ['doc_idx'])
+    accuracies = cross_validate_clf(
+        xy_df, model, fold_docs, ngram_range=job.ngram_range
+    )
+    row = grid_job_settings(job)
+    row.update({i: accuracy for i, accuracy in enumerate(accuracies)})
+    row['mean'] = accuracies.mean()
+    row['error'] = None
+    return row
+
+
+# ====================
+def grid_job_settings(job: GridJob) -> dict:
+    """Get the settings of a job as the first columns of its result row.
+
+    Args:
+      job (GridJob):
+        The job
+
+    Returns:
+      dict:
+        The language pair, system set, preprocessing steps, ngram range,
+        min_len and model name
+    """
+
+    return {
+        'language_pair': job.language_pair,
+        'system_set': job.system_set,
+        'preprocessing_steps': job.preprocessing_steps,
+        'ngram_range': job.ngram_range,
+        'min_len': job.min_len,
+        'model': job.model_name
+    }
+
+
+# ====================
+def failed_grid_row(job: GridJob, num_folds: int, error: Exception) -> dict:
+    """Get the result row of a job that raised an exception, with the same
+    columns as the row of a successful job (see run_grid_job).
+
+    Args:
+      job (GridJob):
+        The job
+      num_folds (int):
+        The number of folds
+      error (Exception):
+        The exception
+
+    Returns:
+      dict:
+        A result row with NaN accuracies and the exception in 'error'
+    """
+
+    row = grid_job_settings(job)
+    row.update({i: np.nan for i in range(num_folds)})
+    row['mean'] = np.nan
+    row['error'] = f'{type(error).__name__}: {error}'
+    return row
+
+
+# ====================
+def run_grid(spec: Dict[str, Any],
+             corpora: Dict[str, pd.DataFrame],
+             dataset: str = 'ted',
+             para_system: str = 'src',
+             num_folds: int = 5,
+             n_jobs: Optional[int] = None,
+             out_path: Optional[str] = None) -> Iterator[dict]:
+    """Run every experiment in a grid on a pool of worker processes,
+    yielding each result row as soon as its job finishes.
+
+    Args:
+      spec (Dict[str, Any]):
+        The grid specification (see expand_grid)
+      corpora (Dict[str, pd.DataFrame]):
+        A sentence-level DataFrame for each language pair in the spec
+        (see init_grid_worker). POS columns must already have been added
+        (see preprocessing.text_col_to_pos) to use POS preprocessing steps.
+      dataset (str, optional):
+        The dataset part of the column names. Defaults to 'ted'.
+      para_system (str, optional):
+        The system whose token counts determine the pseudo-paragraphs and
+        folds. Defaults to 'src'.
+      num_folds (int, optional):
+        The number of folds. Defaults to 5.
+      n_jobs (Optional[int], optional):
+        The number of worker processes (see get_n_jobs).
+        Defaults to None (run jobs in this process).
+      out_path (Optional[str], optional):
+        A CSV file to append each result row to as it arrives.
+        Defaults to None.
+
+    Yields:
+      Iterator[dict]:
+        The result row of each job (see run_grid_job), in order of
+        completion. A job that raises an exception does not stop the
+        others: its row has NaN accuracies and the exception in 'error'
+        (see failed_grid_row).
+    """
+
+    jobs = expand_grid(spec)
+    models = spec['models']
+    n_jobs = get_n_jobs(n_jobs)
+    if n_jobs == 1:
+        init_grid_worker(corpora)
+        for job in jobs:
+            try:
+                row = run_grid_job(
+                    job, models[job.model_name], dataset, para_system, num_folds
+                )
+            except Exception as e:
+                row = failed_grid_row(job, num_folds, e)
+            write_grid_row(row, out_path)
+            yield row
+        return
+    with ProcessPoolExecutor(max_workers=n_jobs,
+                             initializer=init_grid_worker,
+                             initargs=(corpora,)) as executor:
+        futures = {
+            executor.submit(
+                run_grid_job, job, models[job.model_name], dataset,
+                para_system, num_folds
+            ): job
+            for job in jobs
+        }
+        for future in as_completed(futures):
+            try:
+                row = future.result()
+            except Exception as e:
+                row = failed_grid_row(futures[future], num_folds, e)
+            write_grid_row(row, out_path)
+            yield row
+
+
+# ====================
+def write_grid_row(row: dict, out_path: Optional[str]):
+    """Append a result row to a CSV file, writing the header first if the
+    file does not exist yet.
+
+    Args:
+      row (dict):
+        The result row
+      out_path (Optional[str]):
+        The path to the CSV file. Nothing is written if None.
+    """
+
+    if out_path is None:
+        return
+    pd.DataFrame([row]).to_csv(
+        out_path, mode='a', index=False, header=not os.path.exists(out_path)
+    )
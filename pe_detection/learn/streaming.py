@@ -0,0 +1,247 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import normalize
+
+from pe_detection.learn.featurizers import whitespace_tokenizer
+from pe_detection.tools.transform_data import paras_df_to_xy_df
+
+DEFAULT_N_FEATURES = 2 ** 20
+
+
+# ====================
+def hashing_vectorizer(ngram_range: Tuple[int, int] = (1, 1),
+                       n_features: int = DEFAULT_N_FEATURES) -> HashingVectorizer:
+    """Get a stateless featurizer that counts whitespace-separated word
+    n-grams like WhitespaceCountVectorizer, but maps them to columns with a
+    hash function instead of a fitted vocabulary.
+
+    Args:
+      ngram_range (Tuple[int, int], optional):
+        The smallest and largest n of the word n-grams to count.
+        Defaults to (1, 1).
+      n_features (int, optional):
+        The number of columns. Defaults to DEFAULT_N_FEATURES (2 ** 20).
+
+    Returns:
+      HashingVectorizer:
+        The featurizer, which outputs non-negative counts (as required by
+        MultinomialNB)
+    """
+
+    return HashingVectorizer(
+        lowercase=False,
+        tokenizer=whitespace_tokenizer,
+        token_pattern=None,
+        ngram_range=ngram_range,
+        n_features=n_features,
+        alternate_sign=False,
+        norm=None
+    )
+
+
+# ====================
+class IncrementalTfidfTransformer(TransformerMixin, BaseEstimator):
+    """A TF-IDF transformer whose document frequencies can be accumulated
+    over chunks of documents with partial_fit. After partial_fit has seen
+    every chunk, transform gives the same result as TfidfTransformer (with
+    the same options) fitted on all of the documents at once.
+
+    Args:
+      norm (Optional[str], optional):
+        'l1', 'l2' or None. Defaults to 'l2'.
+      smooth_idf (bool, optional):
+        Whether to add one to document frequencies. Defaults to True.
+      sublinear_tf (bool, optional):
+        Whether to replace term frequencies with 1 + log(tf).
+        Defaults to False.
+    """
+
+    def __init__(self,
+                 norm: Optional[str] = 'l2',
+                 smooth_idf: bool = True,
+                 sublinear_tf: bool = False):
+
+        self.norm = norm
+        self.smooth_idf = smooth_idf
+        self.sublinear_tf = sublinear_tf
+
+    # ====================
+    def partial_fit(self, X: sp.spmatrix, y=None):
+        """Add the document frequencies of a chunk of documents.
+
+        Args:
+          X (sp.spmatrix):
+            A matrix of term counts with a row for each document
+
+        Returns:
+          IncrementalTfidfTransformer:
+            self
+        """
+
+        X = sp.csr_matrix(X)
+        if not hasattr(self, 'df_'):
+            self.df_ = np.zeros(X.shape[1], dtype=np.int64)
+            self.n_samples_ = 0
+        elif X.shape[1] != len(self.df_):
+            raise ValueError(
+                f"X has {X.shape[1]} features, but {len(self.df_)} were " + \
+                "seen in previous calls to partial_fit."
+            )
+        self.df_ += np.bincount(X.indices, minlength=X.shape[1])
+        self.n_samples_ += X.shape[0]
+        return self
+
+    # ====================
+    def fit(self, X: sp.spmatrix, y=None):
+
+        if hasattr(self, 'df_'):
+            del self.df_
+        return self.partial_fit(X)
+
+    # ====================
+    @property
+    def idf_(self) -> np.ndarray:
+
+        smooth = int(self.smooth_idf)
+        return np.log((self.n_samples_ + smooth) / (self.df_ + smooth)) + 1
+
+    # ====================
+    def transform(self, X: sp.spmatrix) -> sp.csr_matrix:
+
+        X = sp.csr_matrix(X, dtype=np.float64, copy=True)
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1
+        X.data *= self.idf_[X.indices]
+        if self.norm is not None:
+            X = normalize(X, norm=self.norm, copy=False)
+        return X
+
+
+# ====================
+def iter_xy_chunks(source: Union[str, pd.DataFrame, Iterable[pd.DataFrame]],
+                   x_label: str = 'x',
+                   y_label: str = 'y',
+                   cols_to_classes: Optional[Dict[str, str]] = None,
+                   chunksize: int = 10_000) -> Iterator[Tuple[List[str], np.ndarray]]:
+    """Read texts and class labels from a source in chunks.
+
+    Args:
+      source (Union[str, pd.DataFrame, Iterable[pd.DataFrame]]):
+        The path to a CSV file, a DataFrame, or an iterable of DataFrames
+        (e.g. the reader returned by pd.read_csv with chunksize)
+      x_label (str, optional):
+        The label of the text column. Defaults to 'x'.
+      y_label (str, optional):
+        The label of the class label column. Defaults to 'y'.
+      cols_to_classes (Optional[Dict[str, str]], optional):
+        If given, each chunk has a column for each text type and a row for
+        each paragraph, and is converted with paras_df_to_xy_df using this
+        mapping of column labels to class labels. Defaults to None.
+      chunksize (int, optional):
+        The number of rows per chunk when reading a CSV file or a
+        DataFrame. Defaults to 10,000.
+
+    Yields:
+      Iterator[Tuple[List[str], np.ndarray]]:
+        The texts and class labels in each chunk
+    """
+
+    if isinstance(source, str):
+        usecols = list(cols_to_classes) if cols_to_classes is not None \
+            else [x_label, y_label]
+        source = pd.read_csv(source, usecols=usecols, chunksize=chunksize)
+    elif isinstance(source, pd.DataFrame):
+        df = source
+        source = (df.iloc[i:i+chunksize] for i in range(0, len(df), chunksize))
+    for chunk in source:
+        if cols_to_classes is not None:
+            chunk = paras_df_to_xy_df(chunk, cols_to_classes)
+        yield chunk[x_label].to_list(), chunk[y_label].to_numpy()
+
+
+# ====================
+def train_streaming_clf(source: Union[str, pd.DataFrame, Iterable[pd.DataFrame]],
+                        model: Any,
+                        classes: Optional[List[str]] = None,
+                        x_label: str = 'x',
+                        y_label: str = 'y',
+                        cols_to_classes: Optional[Dict[str, str]] = None,
+                        ngram_range: Tuple[int, int] = (1, 1),
+                        n_features: int = DEFAULT_N_FEATURES,
+                        chunksize: int = 10_000) -> Pipeline:
+    """Train a TF-IDF classifier on data that is read in chunks, so that
+    memory use depends on the chunk size and n_features rather than on the
+    size of the corpus.
+
+    Features are hashed n-gram counts (see hashing_vectorizer), so no
+    vocabulary has to be held in memory. If source is a path or a DataFrame,
+    it is read twice: first to accumulate document frequencies, then to
+    train the model on exact TF-IDF features. Any other iterable is read
+    once, and each chunk is weighted with the document frequencies of the
+    chunks seen so far.
+
+    Args:
+      source (Union[str, pd.DataFrame, Iterable[pd.DataFrame]]):
+        The training data (see iter_xy_chunks)
+      model (Any):
+        A scikit-learn estimator that supports partial_fit
+        (e.g. MultinomialNB or SGDClassifier)
+      classes (Optional[List[str]], optional):
+        All of the class labels. Required if source can only be read once.
+        Defaults to None (collect them in the first pass).
+      x_label (str, optional):
+        The label of the text column. Defaults to 'x'.
+      y_label (str, optional):
+        The label of the class label column. Defaults to 'y'.
+      cols_to_classes (Optional[Dict[str, str]], optional):
+        See iter_xy_chunks. Defaults to None.
+      ngram_range (Tuple[int, int], optional):
+        The range of word n-grams to use as features. Defaults to (1, 1).
+      n_features (int, optional):
+        The number of hashed features. Defaults to 2 ** 20.
+      chunksize (int, optional):
+        The number of rows per chunk (see iter_xy_chunks).
+        Defaults to 10,000.
+
+    Raises:
+      ValueError:
+        If model does not support partial_fit, or if classes is not given
+        for a source that can only be read once.
+
+    Returns:
+      Pipeline:
+        A fitted pipeline with 'vect', 'tfidf' and 'clf' steps, which can
+        be used in the same way as the output of train_tfidf_count_clf.
+    """
+
+    if not hasattr(model, 'partial_fit'):
+        raise ValueError(f"{type(model).__name__} does not support partial_fit.")
+    two_pass = isinstance(source, (str, pd.DataFrame))
+    if classes is None and not two_pass:
+        raise ValueError(
+            "classes must be given when source can only be read once."
+        )
+    vect = hashing_vectorizer(ngram_range, n_features)
+    tfidf = IncrementalTfidfTransformer()
+    if two_pass:
+        seen_classes = set()
+        for texts, labels in iter_xy_chunks(
+                source, x_label, y_label, cols_to_classes, chunksize):
+            tfidf.partial_fit(vect.transform(texts))
+            seen_classes.update(labels)
+        if classes is None:
+            classes = sorted(seen_classes)
+    for texts, labels in iter_xy_chunks(
+            source, x_label, y_label, cols_to_classes, chunksize):
+        X = vect.transform(texts)
+        if not two_pass:
+            tfidf.partial_fit(X)
+        model.partial_fit(tfidf.transform(X), labels, classes=classes)
+    return Pipeline([('vect', vect), ('tfidf', tfidf), ('clf', model)])
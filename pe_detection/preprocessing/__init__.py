@@ -1 +1,16 @@
-from pe_detection.preprocessing.preprocessing import *
\ No newline at end of file
+# Submodules are imported on first use of one of their names, so that
+# importing pe_detection.preprocessing does not load spaCy
+# (see pe_detection/tools/lazy_import.py)
+from pe_detection.tools.lazy_import import lazy_package
+
+lazy_package(__name__, {
+    'pos_cache': [
+        'DEFAULT_MAX_CACHE_BYTES', 'MAX_PARAMS', 'model_id', 'entry_size',
+        'POSCache'
+    ],
+    'preprocessing': [
+        'NLP', 'POS_COMPONENTS', 'CACHE_BLOCK_SIZE', 'get_nlp',
+        'iter_pos_tags', 'iter_pos_tags_cached', 'text_col_to_pos',
+        'apply_pos_to_series', 'pos_tags'
+    ],
+})
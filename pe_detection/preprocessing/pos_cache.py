@@ -0,0 +1,253 @@
+import hashlib
+import sqlite3
+import time
+from typing import Dict, Iterable, Tuple
+
+DEFAULT_MAX_CACHE_BYTES = 1024 ** 3
+# SQLite limits the number of parameters in a single statement
+MAX_PARAMS = 500
+
+
+# ====================
+def model_id(nlp) -> str:
+    """Get a string identifying a spaCy pipeline and the version of spaCy
+    that runs it, for use in POS cache keys.
+
+    Args:
+      nlp (spacy.language.Language):
+        The pipeline
+
+    Returns:
+      str:
+        E.g. 'de_core_news_sm-3.8.0 (spacy 3.8.2)'
+    """
+
+    import spacy
+
+    meta = nlp.meta
+    return f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')} " + \
+        f"(spacy {spacy.__version__})"
+
+
+# ====================
+def entry_size(key: bytes, tokens: str, pos: str) -> int:
+    """Get the size of a cache entry in bytes.
+
+    Args:
+      key (bytes):
+        The key (see POSCache.key)
+      tokens (str):
+        The space-separated tokens
+      pos (str):
+        The space-separated POS tags
+
+    Returns:
+      int:
+        The total size of the key and the UTF-8 encoded tokens and tags
+    """
+
+    return len(key) + len(tokens.encode('utf-8')) + len(pos.encode('utf-8'))
+
+
+# ====================
+class POSCache:
+    """A persistent cache of POS tagging results stored in an SQLite
+    database, so that texts that have already been tagged with a given
+    pipeline are never tagged again.
+
+    Each entry is keyed by the SHA-256 hash of the pipeline name and version
+    (see model_id), whether the text was pretokenized, and the text itself.
+    The value is the pair of space-separated tokens and POS tags. Once the
+    total size of the keys and UTF-8 encoded strings exceeds max_bytes, the
+    least recently used entries are evicted.
+
+    Args:
+      path (str):
+        The path to the database file (e.g. 'cache/pos.sqlite3').
+        Created if it does not exist.
+      max_bytes (int, optional):
+        The maximum total size of the keys and UTF-8 encoded tokens and
+        tags in bytes.
+        Defaults to DEFAULT_MAX_CACHE_BYTES (1 GiB).
+    """
+
+    def __init__(self,
+                 path: str,
+                 max_bytes: int = DEFAULT_MAX_CACHE_BYTES):
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS pos ('
+            'key BLOB PRIMARY KEY, tokens TEXT, pos TEXT, '
+            'size INTEGER, last_used REAL)'
+        )
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS pos_last_used ON pos (last_used)'
+        )
+        self.conn.commit()
+
+    # ====================
+    @staticmethod
+    def key(model: str, text: str, pretokenized: bool = False) -> bytes:
+        """Get the cache key for a text.
+
+        Args:
+          model (str):
+            The pipeline identifier (see model_id)
+          text (str):
+            The text
+          pretokenized (bool, optional):
+            Whether the text is tagged as pretokenized text.
+            Defaults to False.
+
+        Returns:
+          bytes:
+            The key
+        """
+
+        h = hashlib.sha256(model.encode('utf-8'))
+        h.update(b'\x01' if pretokenized else b'\x00')
+        h.update(text.encode('utf-8', 'surrogatepass'))
+        return h.digest()
+
+    # ====================
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, Tuple[str, str]]:
+        """Look up several keys at once, marking the entries found as
+        recently used and updating the hit and miss counts.
+
+        Args:
+          keys (Iterable[bytes]):
+            The keys to look up
+
+        Returns:
+          Dict[bytes, Tuple[str, str]]:
+            The tokens and POS tags for each key that is in the cache
+        """
+
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(keys), MAX_PARAMS):
+            batch = keys[start:start + MAX_PARAMS]
+            rows = self.conn.execute(
+                'SELECT key, tokens, pos FROM pos WHERE key IN ' + \
+                f"({','.join('?' * len(batch))})",
+                batch
+            )
+            found.update((key, (tokens, pos)) for key, tokens, pos in rows)
+        if found:
+            now = time.time()
+            self.conn.executemany(
+                'UPDATE pos SET last_used = ? WHERE key = ?',
+                ((now, key) for key in found)
+            )
+            self.conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    # ====================
+    def put_many(self, items: Dict[bytes, Tuple[str, str]]):
+        """Add entries to the cache, then evict least recently used entries
+        until the cache fits in max_bytes.
+
+        Args:
+          items (Dict[bytes, Tuple[str, str]]):
+            The tokens and POS tags for each key
+        """
+
+        now = time.time()
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO pos VALUES (?, ?, ?, ?, ?)',
+            (
+                (key, tokens, pos, entry_size(key, tokens, pos), now)
+                for key, (tokens, pos) in items.items()
+            )
+        )
+        self.conn.commit()
+        self.evict()
+
+    # ====================
+    def size(self) -> int:
+        """Get the total size of the cache entries in bytes.
+
+        Returns:
+          int:
+            The total size
+        """
+
+        return self.conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM pos'
+        ).fetchone()[0]
+
+    # ====================
+    def __len__(self) -> int:
+
+        return self.conn.execute('SELECT COUNT(*) FROM pos').fetchone()[0]
+
+    # ====================
+    def evict(self):
+        """Remove least recently used entries until the total size of the
+        cache is no greater than max_bytes."""
+
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+        rows = self.conn.execute('SELECT key, size FROM pos ORDER BY last_used')
+        to_delete = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            to_delete.append((key,))
+            excess -= size
+        self.conn.executemany('DELETE FROM pos WHERE key = ?', to_delete)
+        self.conn.commit()
+
+    # ====================
+    def stats(self) -> dict:
+        """Get hit and miss statistics for this session along with the
+        current size of the cache.
+
+        Returns:
+          dict:
+            A dictionary with keys 'hits', 'misses', 'hit_rate', 'entries'
+            and 'bytes'
+        """
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self),
+            'bytes': self.size()
+        }
+
+    # ====================
+    def clear(self):
+        """Remove all entries from the cache and reset the statistics."""
+
+        self.conn.execute('DELETE FROM pos')
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    # ====================
+    def close(self):
+        """Close the database connection."""
+
+        self.conn.close()
+
+    # ====================
+    def __enter__(self):
+
+        return self
+
+    # ====================
+    def __exit__(self, *args):
+
+        self.close()
@@ -1,41 +1,196 @@
-from typing import Optional, Union, List, Tuple
+from itertools import islice
+from typing import Iterable, Iterator, Optional, Union, List, Tuple
 import pandas as pd
 import spacy
+from spacy.tokens import Doc
+
+from pe_detection.preprocessing.pos_cache import POSCache, model_id
+from pe_detection.tools.interning import broadcast_unique, intern_texts
 
 
 NLP = {}
+# Pipeline components needed to assign coarse-grained POS tags. Everything
+# else (parser, NER, lemmatizer, etc.) is disabled when a pipeline is loaded.
+POS_COMPONENTS = [
+    'tok2vec',
+    'transformer',
+    'tagger',
+    'morphologizer',
+    'attribute_ruler'
+]
+# Number of texts looked up in the POS cache at a time
+CACHE_BLOCK_SIZE = 100_000
 
 
 # ====================
-def text_col_to_pos(df: pd.DataFrame, pipeline: str, col_label_or_labels: Optional[Union[str, List[str]]] = 'x') -> str:
+def get_nlp(pipeline: str) -> spacy.language.Language:
+    """Load a spaCy pipeline with only the components needed for POS tagging
+    enabled, caching it so that each pipeline is only loaded once.
+
+    Args:
+      pipeline (str):
+        The name of or path to the pipeline (e.g. 'de_core_news_sm')
+
+    Returns:
+      spacy.language.Language:
+        The pipeline
+    """
 
     if pipeline not in NLP:
-        NLP[pipeline] = spacy.load(pipeline)
+        nlp = spacy.load(pipeline)
+        nlp.select_pipes(
+            enable=[name for name in nlp.pipe_names if name in POS_COMPONENTS]
+        )
+        NLP[pipeline] = nlp
+    return NLP[pipeline]
+
+
+# ====================
+def iter_pos_tags(texts: Iterable[str],
+                  pipeline: str,
+                  pretokenized: bool = False,
+                  batch_size: int = 1000,
+                  n_process: int = 1,
+                  cache: Optional[Union[POSCache, str]] = None
+                  ) -> Iterator[Tuple[str, str]]:
+    """Tokenize and POS tag a stream of texts in batches, yielding the results
+    in the same order as the texts.
+
+    Args:
+      texts (Iterable[str]):
+        The texts to tag
+      pipeline (str):
+        The name of or path to the spaCy pipeline (see get_nlp)
+      pretokenized (bool, optional):
+        If True, the texts are already tokenized with tokens separated by
+        spaces (e.g. *.norm.tok files), and spaCy's tokenizer is skipped.
+        Defaults to False.
+      batch_size (int, optional):
+        The number of texts to process at a time. Defaults to 1000.
+      n_process (int, optional):
+        The number of processes to use. -1 for all CPUs. Defaults to 1.
+      cache (Optional[Union[POSCache, str]], optional):
+        A POSCache, or the path to its database file. Texts found in the
+        cache are not tagged again, and newly tagged texts are added to it.
+        Defaults to None.
+
+    Yields:
+      Iterator[Tuple[str, str]]:
+        The space-separated tokens and POS tags of each text
+    """
+
+    if cache is not None:
+        yield from iter_pos_tags_cached(
+            texts, pipeline, pretokenized, batch_size, n_process, cache
+        )
+        return
+    nlp = get_nlp(pipeline)
+    if pretokenized:
+        texts = (Doc(nlp.vocab, words=text.split()) for text in texts)
+    for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process):
+        yield ' '.join(t.text for t in doc), ' '.join(t.pos_ for t in doc)
+
+
+# ====================
+def iter_pos_tags_cached(texts: Iterable[str],
+                         pipeline: str,
+                         pretokenized: bool,
+                         batch_size: int,
+                         n_process: int,
+                         cache: Union[POSCache, str]) -> Iterator[Tuple[str, str]]:
+    """Same as iter_pos_tags, but look texts up in a POSCache first and only
+    tag those that are not found (each distinct text once), adding the
+    results to the cache.
+
+    Texts are processed in blocks of CACHE_BLOCK_SIZE. If cache is a path,
+    the POSCache opened for it is closed when the generator finishes or is
+    closed.
+    """
+
+    # Close the cache when done if it was opened here
+    own_cache = isinstance(cache, str)
+    if own_cache:
+        cache = POSCache(cache)
+    try:
+        model = model_id(get_nlp(pipeline))
+        texts = iter(texts)
+        while True:
+            block = list(islice(texts, CACHE_BLOCK_SIZE))
+            if not block:
+                return
+            keys = [POSCache.key(model, text, pretokenized) for text in block]
+            results = cache.get_many(keys)
+            to_tag = {
+                key: text for key, text in zip(keys, block) if key not in results
+            }
+            if to_tag:
+                new = dict(zip(
+                    to_tag.keys(),
+                    iter_pos_tags(
+                        to_tag.values(), pipeline, pretokenized, batch_size, n_process
+                    )
+                ))
+                cache.put_many(new)
+                results.update(new)
+            for key in keys:
+                yield results[key]
+    finally:
+        if own_cache:
+            cache.close()
+
+
+# ====================
+def text_col_to_pos(df: pd.DataFrame,
+                    pipeline: str,
+                    col_label_or_labels: Optional[Union[str, List[str]]] = 'x',
+                    pretokenized: bool = False,
+                    batch_size: int = 1000,
+                    n_process: int = 1,
+                    cache: Optional[Union[POSCache, str]] = None) -> str:
+
     if isinstance(col_label_or_labels, str):
         col_label_or_labels = [col_label_or_labels]
+    # Tag each distinct text in all columns once, in a single stream so that
+    # worker processes are only started once
+    interned = intern_texts(df, col_label_or_labels)
+    tagged = broadcast_unique(
+        iter_pos_tags(
+            interned.uniques, pipeline, pretokenized, batch_size, n_process, cache
+        ),
+        interned
+    )
     for c in col_label_or_labels:
-        df[c] = df[c].apply(lambda x: pos_tags(x, pipeline))
+        df[c] = tagged[c].to_numpy()
     return df
 
 
 # ====================
-def apply_pos_to_series(series: pd.Series, pipeline: str) -> Tuple[pd.Series]:
+def apply_pos_to_series(series: pd.Series,
+                        pipeline: str,
+                        pretokenized: bool = False,
+                        batch_size: int = 1000,
+                        n_process: int = 1,
+                        cache: Optional[Union[POSCache, str]] = None
+                        ) -> Tuple[pd.Series]:
 
-    if pipeline not in NLP:
-        NLP[pipeline] = spacy.load(pipeline)
-    texts = series.to_list()
-    new_pos = [pos_tags(x, pipeline) for x in texts]
+    interned = intern_texts(series.to_frame('x'), ['x'])
+    new_pos = broadcast_unique(
+        iter_pos_tags(
+            interned.uniques, pipeline, pretokenized, batch_size, n_process, cache
+        ),
+        interned
+    )['x']
     new = pd.Series(new for new, _ in new_pos)
     pos = pd.Series(pos for _, pos in new_pos)
     return new, pos
 
 
 # ====================
-def pos_tags(doc: str, pipeline: str) -> Tuple[str, str]:
+def pos_tags(doc: str, pipeline: str, pretokenized: bool = False) -> Tuple[str, str]:
 
-    if pipeline not in NLP:
-        NLP[pipeline] = spacy.load(pipeline)
-    nlp = NLP[pipeline]
+    nlp = get_nlp(pipeline)
+    if pretokenized:
+        doc = Doc(nlp.vocab, words=doc.split())
     doc_ = nlp(doc)
     doc_tok = [t.text for t in doc_]
     doc_pos = [t.pos_ for t in doc_]
@@ -1,11 +1,61 @@
-from pe_detection.tools.column_name_helper import *
-from pe_detection.tools.df_helper import *
-from pe_detection.tools.get_data import *
-from pe_detection.tools.label_docs import *
-from pe_detection.tools.label_paras import *
-from pe_detection.tools.pandas_helper import *
-from pe_detection.tools.text_helper import *
-from pe_detection.tools.train_test_split import *
-from pe_detection.tools.misc_helper import *
-from pe_detection.tools.transform_data import *
-from pe_detection.tools.visualization import *
+# Submodules are imported on first use of one of their names, so that
+# importing pe_detection.tools does not load matplotlib, requests, etc.
+# (see lazy_import.py)
+from pe_detection.tools.lazy_import import lazy_package
+
+lazy_package(__name__, {
+    'column_name_helper': ['parse_columns', 'get_column_name'],
+    'corpus_store': [
+        'LABEL_COLS', 'require_pyarrow', 'save_corpus', 'corpus_columns',
+        'read_schema', 'index_columns', 'load_corpus', 'csv_to_corpus'
+    ],
+    'df_helper': [
+        'display_row', 'sents_df_to_paras_df', 'iter_paras_dfs',
+        'add_mean_row', 'token_counts_df', 'col_token_count',
+        'token_count_col_label', 'add_token_count_cols', 'zip_words_series'
+    ],
+    'dir_cache': ['DirectoryCache'],
+    'download_cache': ['DEFAULT_MAX_CACHE_BYTES', 'DownloadCache'],
+    'get_data': [
+        'POSTEDITESE_MTSUMMIT19_URL', 'get_session', 'get_content',
+        'get_text', 'iter_decoded_lines', 'get_lines', 'get_github_dirlist',
+        'get_posteditese_mtsummit19_data'
+    ],
+    'interning': [
+        'InternedTexts', 'intern_texts', 'dedup_ratio', 'broadcast_unique',
+        'map_unique', 'share_strings'
+    ],
+    'label_docs': [
+        'get_sentence_numbers', 'check_sentence_numbers',
+        'sent_idxs_to_doc_idxs', 'add_doc_labels', 'show_doc_start_end',
+        'add_role_labels'
+    ],
+    'label_paras': [
+        'flatten', 'get_smallest_partition', 'max_parts_partition',
+        'greedy_partition', 'get_possible_partitions', 'get_para_idxs',
+        'add_para_labels'
+    ],
+    'pandas_helper': ['pandas_options', 'show_all_rows'],
+    'text_helper': ['num_tokens', 'token_counts', 'compact_int_dtype', 'alpha_part'],
+    'train_test_split': [
+        'get_doc_token_counts', 'get_doc_token_counts_df', 'best_split',
+        'closest_subset_sum', 'greedy_subset_sum', 'n_best_splits',
+        'balanced_folds', 'best_transfer', 'train_test_split', 'folds'
+    ],
+    'misc_helper': ['get_digits', 'get_n_jobs'],
+    'minhash': [
+        'PRIME', 'MinHashSketches', 'num_perm_for_error',
+        'stable_ngram_hashes', 'minhash_sketches', 'concat_sketches',
+        'estimate_overlaps'
+    ],
+    'transform_data': [
+        'paras_df_to_xy_df', 'train_test_df_to_xy_dfs', 'ngram_overlaps_df',
+        'ngram_overlap_matrix', 'pairwise_ngram_overlaps', 'ngram_overlaps',
+        'ngram_hashes', 'ngram_overlap', 'get_cols_to_classes'
+    ],
+    'visualization': [
+        'token_counts_histogram', 'visualize_diffs', 'diffs_boxplot',
+        'diffs_scatter'
+    ],
+    'xy_view': ['LazyTexts', 'XYView'],
+})
@@ -0,0 +1,188 @@
+from typing import List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+LABEL_COLS = ['doc_idx', 'para_idx']
+
+
+# ====================
+def require_pyarrow():
+    """Raise an informative error if pyarrow is not installed."""
+
+    if pa is None:
+        raise ImportError(
+            "pyarrow is required to save and load corpora in Arrow format. " + \
+            "Install it with 'pip install pyarrow' or " + \
+            "'pip install pe_detection[arrow]'."
+        )
+
+
+# ====================
+def save_corpus(df: pd.DataFrame,
+                path: str,
+                compression: str = 'uncompressed'):
+    """Save a corpus DataFrame to a columnar Arrow IPC (Feather v2) file, so
+    that individual columns can later be loaded without parsing the others.
+
+    Document and paragraph labels (doc_idx and para_idx columns) are stored as
+    integer columns if they contain no missing values.
+
+    Args:
+      df (pd.DataFrame):
+        The corpus DataFrame (e.g. with a column for each system and
+        optionally doc_idx and para_idx columns)
+      path (str):
+        The path of the file to write (e.g. 'data/wit3/en-de.arrow')
+      compression (str, optional):
+        One of 'uncompressed', 'lz4' or 'zstd'. Only uncompressed files can
+        be memory-mapped without copying when they are loaded.
+        Defaults to 'uncompressed'.
+    """
+
+    require_pyarrow()
+    labels = {
+        c: df[c].astype('int64') for c in LABEL_COLS
+        if c in df.columns and not df[c].isna().any()
+    }
+    if labels:
+        df = df.assign(**labels)
+    table = pa.Table.from_pandas(df, preserve_index=None)
+    feather.write_feather(table, path, compression=compression)
+
+
+# ====================
+def corpus_columns(path: str) -> List[str]:
+    """Get the names of the columns in a corpus file without loading any
+    of its data.
+
+    Args:
+      path (str):
+        The path to a file written by save_corpus
+
+    Returns:
+      List[str]:
+        The column names
+    """
+
+    schema = read_schema(path)
+    return [
+        name for name in schema.names
+        if name not in index_columns(schema)
+    ]
+
+
+# ====================
+def read_schema(path: str):
+    """Read the Arrow schema of a corpus file.
+
+    Args:
+      path (str):
+        The path to a file written by save_corpus
+
+    Returns:
+      pa.Schema:
+        The schema
+    """
+
+    require_pyarrow()
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).schema
+
+
+# ====================
+def index_columns(schema) -> List[str]:
+    """Get the names of the columns that pandas uses to store the
+    DataFrame index in an Arrow schema.
+
+    Args:
+      schema (pa.Schema):
+        The Arrow schema
+
+    Returns:
+      List[str]:
+        The names of the index columns
+    """
+
+    pandas_meta = schema.pandas_metadata or {}
+    return [c for c in pandas_meta.get('index_columns', []) if isinstance(c, str)]
+
+
+# ====================
+def load_corpus(path: str,
+                columns: Optional[List[str]] = None,
+                include_labels: bool = True,
+                memory_map: bool = True,
+                as_table: bool = False) -> pd.DataFrame:
+    """Load some or all of the columns of a corpus saved with save_corpus.
+
+    Only the requested columns are read from the file, so start-up time and
+    memory use are proportional to the columns that are actually used.
+
+    Args:
+      path (str):
+        The path to the corpus file
+      columns (Optional[List[str]], optional):
+        The columns to load. Defaults to None (load all columns).
+      include_labels (bool, optional):
+        Whether to also load the doc_idx and para_idx columns if they are
+        present in the file. Defaults to True.
+      memory_map (bool, optional):
+        Whether to memory-map the file rather than reading it into memory.
+        Defaults to True.
+      as_table (bool, optional):
+        If True, return the pyarrow Table without converting it to a pandas
+        DataFrame. For uncompressed files read with memory_map=True, the
+        table refers to the mapped file without copying it.
+        Defaults to False.
+
+    Returns:
+      pd.DataFrame:
+        The corpus DataFrame with the requested columns
+    """
+
+    require_pyarrow()
+    if columns is not None:
+        schema = read_schema(path)
+        missing = [c for c in columns if c not in schema.names]
+        if missing:
+            raise ValueError(f"Columns not found in {path}: {missing}.")
+        if include_labels:
+            columns = [c for c in LABEL_COLS
+                       if c in schema.names and c not in columns] + list(columns)
+        columns = list(columns) + index_columns(schema)
+    table = feather.read_table(path, columns=columns, memory_map=memory_map)
+    if as_table:
+        return table
+    return table.to_pandas()
+
+
+# ====================
+def csv_to_corpus(csv_path: str,
+                  path: str,
+                  compression: str = 'uncompressed',
+                  **read_csv_kwargs):
+    """Convert a corpus CSV file (e.g. data/wit3/en-de.csv) to a corpus file
+    that can be loaded with load_corpus.
+
+    Args:
+      csv_path (str):
+        The path to the CSV file. The first column is used as the index
+        unless index_col is passed in read_csv_kwargs.
+      path (str):
+        The path of the file to write
+      compression (str, optional):
+        The compression to use (see save_corpus).
+        Defaults to 'uncompressed'.
+      **read_csv_kwargs:
+        Additional keyword arguments for pd.read_csv
+    """
+
+    read_csv_kwargs.setdefault('index_col', 0)
+    save_corpus(pd.read_csv(csv_path, **read_csv_kwargs), path, compression)
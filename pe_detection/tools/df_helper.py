@@ -1,8 +1,10 @@
-from typing import Optional
+from typing import Generator, List, Optional, Union
 
+import numpy as np
 import pandas as pd
 
-from pe_detection.tools.text_helper import num_tokens
+from pe_detection.tools.interning import intern_texts
+from pe_detection.tools.text_helper import compact_int_dtype, token_counts
 
 
 # ====================
@@ -21,34 +23,79 @@ def display_row(df: pd.DataFrame, row_idx: int):
 
 
 # ====================
-def sents_df_to_paras_df(df: pd.DataFrame) -> pd.DataFrame:
+def sents_df_to_paras_df(df: pd.DataFrame,
+                         keep_para_idx: bool = False) -> pd.DataFrame:
     """Convert a pandas DataFrame where each row contains a sentence
     to one where each row contains a (pseudo-)paragraph based on
     information in doc_idx and para_idx columns
 
+    Rows are grouped by (doc_idx, para_idx) in a single pass. Text columns
+    are joined with spaces in sentence order and numeric columns (e.g. token
+    counts added by add_token_count_cols) are summed.
+
     Args:
       df (pd.DataFrame):
         The pandas DataFrame to convert. Must have 'doc_idx' and
         'para_idx' columns.
+      keep_para_idx (bool, optional):
+        Whether to keep the para_idx column in the output.
+        Defaults to False.
 
     Returns:
       pd.DataFrame: A pandas DataFrame where each row contains a
-      (pseudo-)paragraph.
+      (pseudo-)paragraph, ordered by doc_idx and then para_idx.
     """
 
-    doc_idxs = set(df['doc_idx'].to_list())
-    paras_df = pd.DataFrame()
-    for doc_idx in doc_idxs:
-        doc_df = df[df['doc_idx'] == doc_idx]
-        para_idxs = set(doc_df['para_idx'].to_list())
-        for para_idx in para_idxs:
-            next_idx = len(paras_df)
-            for col in [c for c in doc_df.columns
-             if c not in ['para_idx', 'doc_idx']]:
-                paras_df.at[next_idx, col] = ' '.join(
-                    doc_df[doc_df['para_idx'] == para_idx][col].to_list())
-            paras_df.at[next_idx, 'doc_idx'] = doc_idx
-    return paras_df
+    df = df[df['doc_idx'].notna() & df['para_idx'].notna()]
+    doc_idxs = df['doc_idx'].to_numpy()
+    para_idxs = df['para_idx'].to_numpy()
+    order = np.lexsort((para_idxs, doc_idxs))
+    doc_idxs = doc_idxs[order]
+    para_idxs = para_idxs[order]
+    is_start = np.ones(len(order), dtype=bool)
+    is_start[1:] = (doc_idxs[1:] != doc_idxs[:-1]) | (para_idxs[1:] != para_idxs[:-1])
+    starts = np.flatnonzero(is_start)
+    ends = np.append(starts[1:], len(order))
+    paras = {}
+    for col in [c for c in df.columns if c not in ['para_idx', 'doc_idx']]:
+        values = df[col].to_numpy()[order]
+        if pd.api.types.is_numeric_dtype(df[col]) and len(order):
+            paras[col] = np.add.reduceat(
+                values, starts, dtype=np.result_type(values.dtype, 'int64')
+            )
+        else:
+            values = values.tolist()
+            paras[col] = [' '.join(values[s:e]) for s, e in zip(starts, ends)]
+    paras['doc_idx'] = doc_idxs[starts]
+    if keep_para_idx:
+        paras['para_idx'] = para_idxs[starts]
+    return pd.DataFrame(paras)
+
+
+# ====================
+def iter_paras_dfs(df: pd.DataFrame,
+                   keep_para_idx: bool = False
+                   ) -> Generator[pd.DataFrame, None, None]:
+    """Convert a DataFrame where each row contains a sentence to
+    (pseudo-)paragraph DataFrames (see sents_df_to_paras_df) one document
+    at a time.
+
+    Args:
+      df (pd.DataFrame):
+        The pandas DataFrame to convert. Must have 'doc_idx' and
+        'para_idx' columns.
+      keep_para_idx (bool, optional):
+        Whether to keep the para_idx column in the output.
+        Defaults to False.
+
+    Yields:
+      Generator[pd.DataFrame, None, None]:
+        A DataFrame of the (pseudo-)paragraphs of each document, in order of
+        doc_idx.
+    """
+
+    for _, doc_df in df.groupby('doc_idx', sort=True):
+        yield sents_df_to_paras_df(doc_df, keep_para_idx)
 
 
 # ====================
@@ -59,16 +106,37 @@ def add_mean_row(df: pd.DataFrame) -> pd.DataFrame:
 
 # ====================
 def token_counts_df(df: pd.DataFrame,
-                    ignore_cols: Optional[list] = None) -> pd.DataFrame:
+                    ignore_cols: Optional[list] = None,
+                    n_jobs: Optional[int] = None,
+                    compact: bool = False,
+                    dedupe: bool = False) -> pd.DataFrame:
     """Replace each element of a pandas DataFrame (except those in columns
     specified in ignore_cols) with the number of tokens in that element.
 
+    All columns are counted together in a single batched pass
+    (see token_counts).
+
     Args:
       df (pd.DataFrame):
         A pandas DataFrame in which all elements other than those in
         ignore_cols are string objects.
       ignore_cols (Optional[list], optional): 
         A list of columns to ignore. Defaults to None.
+      n_jobs (Optional[int], optional):
+        The number of processes to count tokens in (see token_counts).
+        Defaults to None.
+      compact (bool, optional):
+        Whether to store the counts in each column with the smallest
+        signed integer type that can hold them (see compact_int_dtype),
+        instead of int64. Sums of small-typed columns can overflow, so
+        convert them back to int64 before adding columns together.
+        Defaults to False.
+      dedupe (bool, optional):
+        Whether to count the tokens in each distinct text only once
+        (see interning.intern_texts). Finding the distinct texts costs about
+        as much as counting tokens, so this is only worthwhile when texts
+        are repeated across columns (e.g. dedup_ratio above 1.5).
+        Defaults to False.
 
     Returns:
       pd.DataFrame:
@@ -78,16 +146,74 @@ def token_counts_df(df: pd.DataFrame,
     if ignore_cols is None:
         ignore_cols = []
     columns_to_count = [c for c in df.columns if c not in ignore_cols]
-    counts_df = df.copy()
-    for c in columns_to_count:
-        counts_df[c] = counts_df[c].apply(lambda x: num_tokens(x))
-    return counts_df
+    col_counts = {}
+    if columns_to_count and dedupe:
+        interned = intern_texts(df, columns_to_count)
+        if (interned.codes < 0).any():
+            raise ValueError("Cannot count tokens in missing values.")
+        counts = token_counts(interned.uniques, n_jobs=n_jobs)[interned.codes.T.reshape(-1)]
+    elif columns_to_count:
+        counts = token_counts(
+            np.concatenate([df[c].to_numpy(dtype=object) for c in columns_to_count]),
+            n_jobs=n_jobs
+        )
+    if columns_to_count:
+        for c, counts_ in zip(columns_to_count, np.split(counts, len(columns_to_count))):
+            col_counts[c] = compact_int_dtype(counts_) if compact else counts_
+    return pd.DataFrame(
+        {c: col_counts[c] if c in col_counts else df[c] for c in df.columns},
+        index=df.index
+    )
 
 
 # ====================
 def col_token_count(df: pd.DataFrame, col: str) -> int:
 
-    return token_counts_df(df[[col]]).sum()
+    return int(token_counts(df[col]).sum())
+
+
+# ====================
+def token_count_col_label(col_label: str) -> str:
+    """Get the label of the column used by add_token_count_cols to store
+    token counts for a text column.
+
+    Args:
+      col_label (str):
+        The label of the text column (e.g. 'ted.en-fr.src.en.norm')
+
+    Returns:
+      str:
+        The label of the token count column
+        (e.g. 'ted.en-fr.src.en.norm_num_tokens')
+    """
+
+    return f'{col_label}_num_tokens'
+
+
+# ====================
+def add_token_count_cols(df: pd.DataFrame,
+                         col_labels: Union[str, List[str]]) -> pd.DataFrame:
+    """Add a column containing the number of tokens in each row for each of
+    the specified text columns, so that later stages (e.g.
+    get_doc_token_counts) can reuse the counts instead of recounting.
+
+    Args:
+      df (pd.DataFrame):
+        A pandas DataFrame
+      col_labels (Union[str, List[str]]):
+        The label(s) of the text column(s) to count tokens in
+
+    Returns:
+      pd.DataFrame:
+        The original DataFrame with a new integer column for each text
+        column, labelled as returned by token_count_col_label.
+    """
+
+    if isinstance(col_labels, str):
+        col_labels = [col_labels]
+    for col_label in col_labels:
+        df[token_count_col_label(col_label)] = token_counts(df[col_label])
+    return df
 
 
 # ====================
@@ -0,0 +1,91 @@
+import os
+import threading
+from typing import List, Tuple
+
+
+# ====================
+class DirectoryCache:
+    """Base class for caches stored as entries in a directory, with
+    least-recently-used eviction once the total size of the entries exceeds
+    max_bytes. The modification time of each entry path records when the
+    entry was last used.
+
+    Subclasses define which paths in the directory are entries
+    (_entry_paths), how large each entry is (_entry_size), and how to remove
+    one (_remove_entry).
+
+    Args:
+      cache_dir (str):
+        The path to the cache directory. Created if it does not exist.
+      max_bytes (int):
+        The maximum total size of the entries in bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ====================
+    def _entry_paths(self) -> List[str]:
+
+        raise NotImplementedError
+
+    # ====================
+    def _entry_size(self, path: str) -> int:
+
+        raise NotImplementedError
+
+    # ====================
+    def _remove_entry(self, path: str):
+
+        raise NotImplementedError
+
+    # ====================
+    def _entries(self) -> List[Tuple[str, int, float]]:
+
+        entries = []
+        for path in self._entry_paths():
+            try:
+                size = self._entry_size(path)
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                # Removed by another process
+                continue
+            entries.append((path, size, mtime))
+        return entries
+
+    # ====================
+    def size(self) -> int:
+        """Get the total size of the cache entries in bytes.
+
+        Returns:
+          int:
+            The total size
+        """
+
+        return sum(size for _, size, _ in self._entries())
+
+    # ====================
+    def evict(self):
+        """Remove least recently used entries until the total size of the
+        cache entries is no greater than max_bytes."""
+
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda x: x[2])
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove_entry(path)
+                total -= size
+
+    # ====================
+    def clear(self):
+        """Remove all entries from the cache."""
+
+        with self._lock:
+            for path in self._entry_paths():
+                self._remove_entry(path)
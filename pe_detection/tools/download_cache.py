@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from pe_detection.tools.dir_cache import DirectoryCache
+
+DEFAULT_MAX_CACHE_BYTES = 1024 ** 3
+
+
+# ====================
+class DownloadCache(DirectoryCache):
+    """A directory of downloaded files keyed by URL, with the HTTP validators
+    (ETag/Last-Modified) needed to revalidate them, and least-recently-used
+    eviction once the total size of cached files exceeds max_bytes.
+
+    Each entry is stored as a pair of files named after the SHA-256 hash of
+    the URL: <hash>.body for the raw response body and <hash>.json for its
+    metadata. The modification time of the body file records when the entry
+    was last used.
+
+    Args:
+      cache_dir (str):
+        The path to the cache directory. Created if it does not exist.
+      max_bytes (int, optional):
+        The maximum total size of cached response bodies in bytes.
+        Defaults to DEFAULT_MAX_CACHE_BYTES (1 GiB).
+      max_age (Optional[float], optional):
+        The age in seconds below which a cached entry is used without
+        revalidating it with the server. Defaults to None (always
+        revalidate when online).
+    """
+
+    def __init__(self,
+                 cache_dir: str,
+                 max_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+                 max_age: Optional[float] = None):
+
+        super().__init__(cache_dir, max_bytes)
+        self.max_age = max_age
+
+    # ====================
+    def _paths(self, url: str) -> Tuple[str, str]:
+
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return (
+            os.path.join(self.cache_dir, f'{key}.body'),
+            os.path.join(self.cache_dir, f'{key}.json')
+        )
+
+    # ====================
+    def get(self, url: str) -> Optional[Tuple[bytes, dict]]:
+        """Get the cached body and metadata for a URL, marking the entry as
+        recently used.
+
+        Args:
+          url (str):
+            The URL
+
+        Returns:
+          Optional[Tuple[bytes, dict]]:
+            The cached response body and its metadata (with keys 'url',
+            'etag', 'last_modified', 'encoding' and 'fetched_at'), or None
+            if the URL is not in the cache.
+        """
+
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                content = f.read()
+            os.utime(body_path, None)
+        except (OSError, ValueError):
+            return None
+        return content, meta
+
+    # ====================
+    def put(self, url: str, content: bytes, meta: dict):
+        """Add or replace the entry for a URL, then evict least recently used
+        entries until the cache fits in max_bytes.
+
+        Args:
+          url (str):
+            The URL
+          content (bytes):
+            The response body
+          meta (dict):
+            Metadata to store alongside the body (see get)
+        """
+
+        body_path, meta_path = self._paths(url)
+        meta = {**meta, 'url': url, 'fetched_at': time.time()}
+        tmp_suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(body_path + tmp_suffix, 'wb') as f:
+            f.write(content)
+        with open(meta_path + tmp_suffix, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(body_path + tmp_suffix, body_path)
+        os.replace(meta_path + tmp_suffix, meta_path)
+        self.evict()
+
+    # ====================
+    def touch(self, url: str):
+        """Reset the fetch time of the entry for a URL, e.g. after the server
+        confirms that it is still valid.
+
+        Args:
+          url (str):
+            The URL
+        """
+
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        meta['fetched_at'] = time.time()
+        tmp_path = meta_path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    # ====================
+    def is_fresh(self, meta: dict) -> bool:
+        """Check whether a cached entry can be used without revalidation.
+
+        Args:
+          meta (dict):
+            The metadata of the entry
+
+        Returns:
+          bool:
+            True if the entry is younger than max_age
+        """
+
+        if self.max_age is None:
+            return False
+        return time.time() - meta.get('fetched_at', 0) < self.max_age
+
+    # ====================
+    def _entry_paths(self) -> List[str]:
+
+        return [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir) if name.endswith('.body')
+        ]
+
+    # ====================
+    def _entry_size(self, path: str) -> int:
+
+        return os.path.getsize(path)
+
+    # ====================
+    def _remove_entry(self, path: str):
+
+        for path_ in [path, path[:-len('.body')] + '.json']:
+            try:
+                os.remove(path_)
+            except OSError:
+                pass
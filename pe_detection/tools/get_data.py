@@ -1,14 +1,211 @@
+import codecs
 import html
-from typing import List, Optional
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Iterator, List, Optional, Tuple, Union
 from urllib.parse import urljoin
 
 import bs4
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from pe_detection.tools.download_cache import DownloadCache
+
+POSTEDITESE_MTSUMMIT19_URL = \
+    "https://github.com/antot/posteditese_mtsummit19/tree/master/datasets/"
+
+
+# ====================
+def get_session(pool_size: int = 8,
+                retries: int = 3,
+                backoff_factor: float = 0.5) -> requests.Session:
+    """Get a requests Session with a connection pool and automatic retries,
+    so that TCP/TLS connections are reused across downloads.
+
+    Args:
+      pool_size (int, optional):
+        The maximum number of connections to keep open per host. Should be
+        at least the number of threads sharing the session. Defaults to 8.
+      retries (int, optional):
+        The number of times to retry a request that fails with a connection
+        error or a 429/5xx status code. Defaults to 3.
+      backoff_factor (float, optional):
+        The backoff factor for retries. The n-th retry waits
+        backoff_factor * 2**(n-1) seconds. Defaults to 0.5.
+
+    Returns:
+      requests.Session:
+        The session
+    """
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504)
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# ====================
+def get_content(url: str,
+                session: Optional[requests.Session] = None,
+                timeout: Optional[float] = 60,
+                cache: Optional[DownloadCache] = None,
+                offline: bool = False) -> Tuple[bytes, str]:
+    """Get the raw content at a URL and its text encoding, raising an error
+    for unsuccessful responses.
+
+    If a cache is provided, a cached copy is revalidated with the server
+    using its ETag/Last-Modified validators and only downloaded again if it
+    has changed.
+
+    Args:
+      url (str):
+        The URL
+      session (Optional[requests.Session], optional):
+        The session to use. Defaults to None (use a one-off connection).
+      timeout (Optional[float], optional):
+        The timeout in seconds for each attempt. Defaults to 60.
+      cache (Optional[DownloadCache], optional):
+        The download cache to use. Defaults to None (no caching).
+      offline (bool, optional):
+        If True, only use the cache and never access the network.
+        Defaults to False.
+
+    Raises:
+      RuntimeError:
+        If offline is True and the URL is not in the cache.
+
+    Returns:
+      Tuple[bytes, str]:
+        The response body and the encoding to decode it with
+    """
+
+    cached = cache.get(url) if cache is not None else None
+    if offline and cached is None:
+        raise RuntimeError(
+            f'{url} is not in the download cache and offline mode is enabled.'
+        )
+    if cached is not None:
+        content, meta = cached
+        if offline or cache.is_fresh(meta):
+            return content, meta['encoding'] or 'utf-8'
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    else:
+        headers = None
+    response = (session or requests).get(url, headers=headers, timeout=timeout)
+    if cached is not None and response.status_code == 304:
+        cache.touch(url)
+        return content, meta['encoding'] or 'utf-8'
+    response.raise_for_status()
+    encoding = response.encoding or response.apparent_encoding or 'utf-8'
+    if cache is not None:
+        cache.put(url, response.content, {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'encoding': encoding
+        })
+    return response.content, encoding
+
+
+# ====================
+def get_text(url: str,
+             session: Optional[requests.Session] = None,
+             timeout: Optional[float] = 60,
+             cache: Optional[DownloadCache] = None,
+             offline: bool = False) -> str:
+    """Get the text content at a URL. See get_content for details.
+
+    Returns:
+      str:
+        The decoded response body
+    """
+
+    content, encoding = get_content(url, session, timeout, cache, offline)
+    return str(content, encoding, errors='replace')
+
+
+# ====================
+def iter_decoded_lines(content: bytes,
+                       encoding: str = 'utf-8',
+                       chunk_size: int = 2 ** 16) -> Iterator[str]:
+    """Decode a byte string chunk by chunk and yield its lines with HTML
+    entities unescaped, without holding a second full copy of the text in
+    memory.
+
+    Lines are split in the same places as by str.splitlines, and
+    html.unescape is only called for lines that contain an '&'.
+
+    Args:
+      content (bytes):
+        The encoded text
+      encoding (str, optional):
+        The text encoding. Defaults to 'utf-8'.
+      chunk_size (int, optional):
+        The number of bytes to decode at a time. Defaults to 2 ** 16.
+
+    Yields:
+      Iterator[str]:
+        The lines of the text, without line break characters
+    """
+
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    view = memoryview(content)
+    pending = ''
+    for start in range(0, len(content), chunk_size):
+        pending += decoder.decode(view[start:start+chunk_size])
+        lines = pending.splitlines(keepends=True)
+        # The last line is incomplete if it has no line break yet, or if it
+        # ends in '\r' and the matching '\n' is in the next chunk
+        if lines and (lines[-1].endswith('\r')
+                      or lines[-1].splitlines()[0] == lines[-1]):
+            pending = lines.pop()
+        else:
+            pending = ''
+        for line in lines:
+            line = line[:-2] if line.endswith('\r\n') else line[:-1]
+            yield html.unescape(line) if '&' in line else line
+    pending += decoder.decode(b'', final=True)
+    for line in pending.splitlines():
+        yield html.unescape(line) if '&' in line else line
+
+
+# ====================
+def get_lines(url: str,
+              session: Optional[requests.Session] = None,
+              timeout: Optional[float] = 60,
+              cache: Optional[DownloadCache] = None,
+              offline: bool = False) -> List[str]:
+    """Get the lines of the text content at a URL with HTML entities
+    unescaped. See get_content and iter_decoded_lines for details.
+
+    Returns:
+      List[str]:
+        The lines of the text
+    """
+
+    content, encoding = get_content(url, session, timeout, cache, offline)
+    return list(iter_decoded_lines(content, encoding))
 
 
 # ====================
-def get_github_dirlist(dir_url: str) -> dict:
+def get_github_dirlist(dir_url: str,
+                       session: Optional[requests.Session] = None,
+                       cache: Optional[DownloadCache] = None,
+                       offline: bool = False) -> dict:
     """Get a Python dictionary containing information about files and sub-directories
     in a directory of a GitHub repository.
 
@@ -16,6 +213,13 @@ def get_github_dirlist(dir_url: str) -> dict:
       dir_url (str): 
         The URL the GitHub repository directory
         (e.g. https://github.com/antot/posteditese_mtsummit19/tree/master/datasets/wit3)
+      session (Optional[requests.Session], optional):
+        The session to use. Defaults to None (use a one-off connection).
+      cache (Optional[DownloadCache], optional):
+        The download cache to use. Defaults to None (no caching).
+      offline (bool, optional):
+        If True, read the directory page from the cache only.
+        Defaults to False.
 
     Returns:
       dict:    
@@ -35,7 +239,7 @@ def get_github_dirlist(dir_url: str) -> dict:
             }
     """
     
-    page = requests.get(dir_url).text
+    page = get_text(dir_url, session, cache=cache, offline=offline)
     soup = bs4.BeautifulSoup(page, features='lxml')
     names = [a.text for a in soup.find_all("a", {"class": "js-navigation-open Link--primary"})]
     icons = soup.find_all("svg", attrs={"aria-label": ['File', 'Directory']})
@@ -52,7 +256,15 @@ def get_github_dirlist(dir_url: str) -> dict:
 
 # ====================
 def get_posteditese_mtsummit19_data(dataset: str,
-                                    tags: Optional[List[str]] = None) -> pd.DataFrame:
+                                    tags: Optional[List[str]] = None,
+                                    max_workers: int = 8,
+                                    retries: int = 3,
+                                    backoff_factor: float = 0.5,
+                                    base_url: str = POSTEDITESE_MTSUMMIT19_URL,
+                                    cache: Optional[Union[str, DownloadCache]] = None,
+                                    offline: bool = False,
+                                    report_memory: bool = False
+                                    ) -> pd.DataFrame:
 
     """Get a pandas DataFrame combining all available data from files
     containing the specified tags for data in the datasets at
@@ -64,6 +276,30 @@ def get_posteditese_mtsummit19_data(dataset: str,
       tags (list):
         A list of tags that should appear in file names (e.g. ['en-de', 'tok'] for all
         tokenized data for EN->DE
+      max_workers (int, optional):
+        The maximum number of files to download concurrently. All downloads
+        share a single pooled session. Set to 1 to download files one after
+        another. Defaults to 8.
+      retries (int, optional):
+        The number of times to retry a failed download. Defaults to 3.
+      backoff_factor (float, optional):
+        The backoff factor for retries (see get_session). Defaults to 0.5.
+      base_url (str, optional):
+        The URL of the datasets directory. Can be changed to point to a
+        mirror or a local HTTP server.
+        Defaults to POSTEDITESE_MTSUMMIT19_URL.
+      cache (Optional[Union[str, DownloadCache]], optional):
+        A DownloadCache, or the path to a cache directory, in which to keep
+        the directory listing and the downloaded files. Cached files are
+        revalidated with ETag/Last-Modified and only downloaded again if
+        they have changed. Defaults to None (no caching).
+      offline (bool, optional):
+        If True, build the DataFrame from the cache only, without accessing
+        the network. Requires cache. Defaults to False.
+      report_memory (bool, optional):
+        If True, print the peak memory allocated while downloading and
+        assembling the data, as measured by tracemalloc (which slows down
+        allocation while active). Defaults to False.
 
     Returns:
       pd.DataFrame:
@@ -78,25 +314,49 @@ def get_posteditese_mtsummit19_data(dataset: str,
             "dataset should be one of 'MS', 'taraxu', or 'wit3', " + \
             f"not {dataset}."
         )
-    dirlist = get_github_dirlist(urljoin(
-        "https://github.com/antot/posteditese_mtsummit19/tree/master/datasets/",
-        dataset
-    ))
-    files = {f: url for f, url in dirlist.items() 
-             if url != 'DIR' and all(t in f for t in tags) }
-    df = pd.DataFrame()
-    len_ = -1
-    for file, url in files.items():
-        lines = requests.get(url).text.splitlines()
-        if len_ == -1:
-            len_ = len(lines)
+    if isinstance(cache, str):
+        cache = DownloadCache(cache)
+    if offline and cache is None:
+        raise ValueError("A cache must be provided when offline=True.")
+    if max_workers < 1:
+        raise ValueError(f"max_workers should be at least 1, not {max_workers}.")
+    if report_memory:
+        was_tracing = tracemalloc.is_tracing()
+        if was_tracing:
+            tracemalloc.reset_peak()
         else:
-            if len(lines) != len_:
-                raise RuntimeError(
-                    'Number of lines appears to differ between files. ' + \
-                    f'The first file had {len_} lines, but {file} has ' + \
-                    f'{len(lines)} lines.'
-                )
-        df[file] = pd.Series(lines)
-    df = df.applymap(lambda x: html.unescape(x))
+            tracemalloc.start()
+    try:
+        session = get_session(max_workers, retries, backoff_factor)
+        with session:
+            dirlist = get_github_dirlist(
+                urljoin(base_url, dataset), session, cache, offline
+            )
+            files = {f: url for f, url in dirlist.items() 
+                     if url != 'DIR' and all(t in f for t in tags) }
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                columns = list(executor.map(
+                    partial(get_lines, session=session, cache=cache, offline=offline),
+                    files.values()
+                ))
+        len_ = -1
+        for file, lines in zip(files.keys(), columns):
+            if len_ == -1:
+                len_ = len(lines)
+            else:
+                if len(lines) != len_:
+                    raise RuntimeError(
+                        'Number of lines appears to differ between files. ' + \
+                        f'The first file had {len_} lines, but {file} has ' + \
+                        f'{len(lines)} lines.'
+                    )
+        df = pd.DataFrame(dict(zip(files.keys(), columns)))
+        del columns
+        if report_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            print(f'Peak memory while loading {dataset} data: {peak / 2**20:.1f} MiB')
+    finally:
+        # Stop tracing even if a download fails, as it slows down allocation
+        if report_memory and not was_tracing:
+            tracemalloc.stop()
     return df
@@ -0,0 +1,174 @@
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# ====================
+class InternedTexts(NamedTuple):
+    """The texts in some columns of a DataFrame, stored as one copy of each
+    distinct text and an integer id for each cell.
+
+    Attributes:
+      codes (np.ndarray):
+        An int64 array of shape (number of rows, number of columns) with the
+        position in uniques of the text in each cell, or -1 for missing
+        values
+      uniques (np.ndarray):
+        An object array of the distinct texts, in order of first occurrence
+        (column by column)
+      index (pd.Index):
+        The index of the DataFrame
+      columns (List[str]):
+        The labels of the columns
+    """
+
+    codes: np.ndarray
+    uniques: np.ndarray
+    index: pd.Index
+    columns: List[str]
+
+
+# ====================
+def intern_texts(df: pd.DataFrame,
+                 col_labels: Optional[List[str]] = None) -> InternedTexts:
+    """Map each distinct text in some columns of a DataFrame to a single id,
+    so that expensive functions can be applied once per distinct text
+    (see map_unique).
+
+    Args:
+      df (pd.DataFrame):
+        The DataFrame
+      col_labels (Optional[List[str]], optional):
+        The labels of the text columns. Defaults to None (all columns).
+
+    Returns:
+      InternedTexts:
+        The ids of the texts in each cell and the distinct texts
+    """
+
+    if col_labels is None:
+        col_labels = list(df.columns)
+    stacked = np.concatenate(
+        [df[c].to_numpy(dtype=object) for c in col_labels]
+    ) if col_labels else np.empty(0, dtype=object)
+    codes, uniques = pd.factorize(stacked)
+    codes = codes.astype('int64').reshape(len(col_labels), len(df)).T
+    return InternedTexts(codes, np.asarray(uniques, dtype=object), df.index, list(col_labels))
+
+
+# ====================
+def dedup_ratio(interned: InternedTexts) -> float:
+    """Get the number of non-missing cells per distinct text, i.e. the
+    factor by which work is reduced by processing each distinct text once.
+
+    Args:
+      interned (InternedTexts):
+        The interned texts
+
+    Returns:
+      float:
+        The ratio (1.0 if every text is distinct or there are no texts)
+    """
+
+    num_cells = int((interned.codes >= 0).sum())
+    if not len(interned.uniques):
+        return 1.0
+    return num_cells / len(interned.uniques)
+
+
+# ====================
+def broadcast_unique(values: Iterable[Any],
+                     interned: InternedTexts,
+                     dtype: Optional[Any] = None,
+                     fill_value: Any = None) -> pd.DataFrame:
+    """Build a DataFrame shaped like the interned columns from one value per
+    distinct text.
+
+    Args:
+      values (Iterable[Any]):
+        The value for each distinct text, in the order of interned.uniques
+      interned (InternedTexts):
+        The interned texts
+      dtype (Optional[Any], optional):
+        The dtype of the values. Defaults to None (object, so that values
+        such as tuples are stored as they are).
+      fill_value (Any, optional):
+        The value for missing cells. Defaults to None (None for object
+        values and 0 for other dtypes).
+
+    Returns:
+      pd.DataFrame:
+        A DataFrame with the same index and columns as the interned texts
+    """
+
+    if dtype is None:
+        values_ = np.empty(len(interned.uniques) + 1, dtype=object)
+        # Assigned one by one so that tuples are not unpacked into a 2D array
+        for i, value in enumerate(values):
+            values_[i] = value
+    else:
+        values_ = np.empty(len(interned.uniques) + 1, dtype=dtype)
+        values_[:-1] = np.fromiter(values, dtype=dtype, count=len(interned.uniques))
+    # Code -1 (missing) picks the fill value at the end
+    if fill_value is not None:
+        values_[-1] = fill_value
+    elif dtype is not None:
+        values_[-1] = 0
+    data = values_[interned.codes]
+    return pd.DataFrame(
+        {c: data[:, i] for i, c in enumerate(interned.columns)},
+        index=interned.index
+    )
+
+
+# ====================
+def map_unique(func: Callable[[str], Any],
+               interned: InternedTexts,
+               dtype: Optional[Any] = None) -> pd.DataFrame:
+    """Apply a function once to each distinct text and broadcast the results
+    back to every cell that contains it.
+
+    Args:
+      func (Callable[[str], Any]):
+        The function (e.g. text_helper.num_tokens)
+      interned (InternedTexts):
+        The interned texts
+      dtype (Optional[Any], optional):
+        The dtype of the results (see broadcast_unique). Defaults to None.
+
+    Returns:
+      pd.DataFrame:
+        A DataFrame with the same index and columns as the interned texts,
+        containing the result for each cell (missing cells are filled as
+        in broadcast_unique)
+    """
+
+    return broadcast_unique(map(func, interned.uniques), interned, dtype)
+
+
+# ====================
+def share_strings(df: pd.DataFrame,
+                  col_labels: Optional[List[str]] = None) -> pd.DataFrame:
+    """Return a copy of a DataFrame in which cells with identical texts refer
+    to the same string object, so that repeated texts (e.g. source texts
+    repeated across columns, or post-edits identical to their MT output)
+    are only held in memory once.
+
+    Args:
+      df (pd.DataFrame):
+        The DataFrame
+      col_labels (Optional[List[str]], optional):
+        The labels of the text columns. Defaults to None (all columns with
+        object dtype).
+
+    Returns:
+      pd.DataFrame:
+        The new DataFrame
+    """
+
+    if col_labels is None:
+        col_labels = [c for c in df.columns if df[c].dtype == object]
+    interned = intern_texts(df, col_labels)
+    shared = broadcast_unique(interned.uniques, interned, fill_value=np.nan)
+    return df.assign(**{c: shared[c] for c in col_labels})
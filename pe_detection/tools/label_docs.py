@@ -1,5 +1,6 @@
-from typing import List, Tuple
+from typing import List, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 
 
@@ -29,30 +30,124 @@ def get_sentence_numbers(path: str) -> List[Tuple[int, int]]:
 
 
 # ====================
-def add_doc_labels(sents_df: pd.DataFrame, sent_numbers_path: str) -> pd.DataFrame:
+def check_sentence_numbers(sentence_numbers: List[Tuple[int, int]],
+                           allow_gaps: bool = False):
+    """Check that document sentence ranges do not overlap and (optionally)
+    leave no gaps between one document and the next.
+
+    Args:
+      sentence_numbers (List[Tuple[int, int]]):
+        A list of tuples of the form (first_sentence_index, last_sentence_index)
+        (can be obtained using get_sentence_numbers).
+      allow_gaps (bool, optional):
+        Whether to allow sentences between documents that do not belong to
+        any document. Defaults to False.
+
+    Raises:
+      ValueError:
+        If a range is empty, two ranges overlap, or there is a gap between
+        two ranges and allow_gaps is False.
+    """
+
+    for doc_idx, (first, last) in enumerate(sentence_numbers):
+        if first > last:
+            raise ValueError(
+                f"Document {doc_idx} has an empty sentence range: {first}-{last}."
+            )
+    ordered = sorted(enumerate(sentence_numbers), key=lambda x: x[1][0])
+    for (prev_doc, (_, prev_last)), (doc, (first, _)) in zip(ordered, ordered[1:]):
+        if first <= prev_last:
+            raise ValueError(
+                f"Sentence ranges of documents {prev_doc} and {doc} overlap."
+            )
+        if first > prev_last + 1 and not allow_gaps:
+            raise ValueError(
+                f"Sentences {prev_last+1}-{first-1} between documents " + \
+                f"{prev_doc} and {doc} do not belong to any document. " + \
+                "Set allow_gaps=True to allow this."
+            )
+
+
+# ====================
+def sent_idxs_to_doc_idxs(sent_idxs: Sequence[int],
+                          sentence_numbers: List[Tuple[int, int]]) -> np.ndarray:
+    """Look up the document to which each of a sequence of sentence indices
+    belongs.
+
+    Args:
+      sent_idxs (Sequence[int]):
+        The sentence indices
+      sentence_numbers (List[Tuple[int, int]]):
+        A list of non-overlapping tuples of the form
+        (first_sentence_index, last_sentence_index)
+        (can be obtained using get_sentence_numbers).
+
+    Returns:
+      np.ndarray:
+        An integer array containing the document index for each sentence,
+        or -1 for sentences that do not belong to any document.
+    """
+
+    sent_idxs = np.asarray(sent_idxs, dtype='int64')
+    if not sentence_numbers:
+        return np.full(len(sent_idxs), -1, dtype='int64')
+    ranges = np.asarray(sentence_numbers, dtype='int64')
+    order = np.argsort(ranges[:, 0], kind='stable')
+    firsts = ranges[order, 0]
+    lasts = ranges[order, 1]
+    pos = np.searchsorted(firsts, sent_idxs, side='right') - 1
+    found = (pos >= 0) & (sent_idxs <= lasts[np.maximum(pos, 0)])
+    return np.where(found, order[np.maximum(pos, 0)], -1)
+
+
+# ====================
+def add_doc_labels(sents_df: pd.DataFrame,
+                   sent_numbers_path: str,
+                   allow_gaps: bool = False) -> pd.DataFrame:
     """Add document labels to a DataFrame based on information from a text file
 
     Args:
       sents_df (pd.DataFrame):
-        A DataFrame in which each row contains a single sentence.
+        A DataFrame in which each row contains a single sentence. The index
+        labels are taken to be sentence numbers.
       sent_numbers_path (str):
         The path to the text file. Each line in the text file should begin
         with a pair of integers separated by a hyphen indicating the range of
         sentence numbers, followed by a colon.
         E.g. '514-599: https://shukepianblog.wordpress.com/'
+      allow_gaps (bool, optional):
+        Whether to allow sentences that do not belong to any document. If
+        True, doc_idx is a nullable integer column with missing values for
+        those sentences. Defaults to False.
+
+    Raises:
+      ValueError:
+        If document sentence ranges overlap, or if any sentence does not
+        belong to a document and allow_gaps is False.
 
     Returns:
       pd.DataFrame:
-        The original DataFrame with an extra column, doc_idx containing an index
-        uniquely identifying the document to which each sentence belongs.
+        A DataFrame with the columns of the original DataFrame and an extra
+        integer column, doc_idx containing an index uniquely identifying the
+        document to which each sentence belongs. The original DataFrame is
+        not modified, and its columns are not copied.
     """
 
     sentence_numbers = get_sentence_numbers(sent_numbers_path)
-    labelled = sents_df.copy()
-    for doc_idx, doc_lines in enumerate(sentence_numbers):
-        first_line, last_line = doc_lines
-        for i in range(first_line, last_line+1):
-            labelled.at[i, 'doc_idx'] = int(doc_idx)
+    check_sentence_numbers(sentence_numbers, allow_gaps=allow_gaps)
+    doc_idxs = sent_idxs_to_doc_idxs(sents_df.index.to_numpy(), sentence_numbers)
+    unlabelled = doc_idxs == -1
+    if unlabelled.any():
+        if not allow_gaps:
+            raise ValueError(
+                f"{unlabelled.sum()} sentences (e.g. sentence " + \
+                f"{sents_df.index[unlabelled][0]}) do not belong to any " + \
+                "document. Set allow_gaps=True to allow this."
+            )
+        doc_idxs = pd.array(doc_idxs, dtype='Int64')
+        doc_idxs[unlabelled] = pd.NA
+    labelled = sents_df.copy(deep=False)
+    labelled['doc_idx'] = doc_idxs
     return labelled
 
 
@@ -1,9 +1,17 @@
-from itertools import chain
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import accumulate, chain
 from typing import Generator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
-from pe_detection.tools.text_helper import num_tokens
+from pe_detection.tools.df_helper import token_count_col_label
+from pe_detection.tools.misc_helper import get_n_jobs
+from pe_detection.tools.text_helper import token_counts
 
 
 # ====================
@@ -27,14 +35,20 @@ def flatten(lis_: List[list]) -> list:
 # ====================
 def get_smallest_partition(lis_: List[int],
                            min_: int,
-                           max_diff: int = 100) -> Tuple[List[List[int]], int]:
+                           max_diff: int = 100,
+                           time_budget: Optional[float] = None
+                           ) -> Tuple[List[List[int]], int]:
     """Find the partition of a list of integers such that the sum of
     the integers in each sub-list is no less than min_, but the maximum
     sum of a integers in any sub-list is as close as possible to min_.
 
+    The smallest feasible maximum is found by binary search between min_
+    and min_+max_diff, using max_parts_partition to test each candidate,
+    so the running time is O(n log max_diff) for a list of length n.
+
     Args:
       lis_ (List[int]):
-        A list of integers (e.g. [12, 5, 7, 13, 6, 5])
+        A list of non-negative integers (e.g. [12, 5, 7, 13, 6, 5])
       min_ (int): 
         The minimum value for the sum of the integers in any of the
         sub-lists in the partition.
@@ -43,10 +57,17 @@ def get_smallest_partition(lis_: List[int],
         sub-list. For example, if min_=12 and max=12, sub-lists in the
         partition may sum up to 24 but no higher.
         Defaults to 100.
+      time_budget (Optional[float], optional):
+        The maximum time in seconds to spend searching. If the budget runs
+        out, the best partition found so far is returned. If it is set and
+        there is no partition that satisfies the requirements, a warning is
+        issued and the result of greedy_partition is returned instead, whose
+        sub-list sums may exceed min_+max_diff. Defaults to None (no limit).
 
     Raises:
       ValueError:
-        If there are no partitions that satisfy the requirements.
+        If there are no partitions that satisfy the requirements and
+        time_budget is None.
 
     Returns:
       Tuple[List[List[int]], int]: _description_
@@ -56,20 +77,133 @@ def get_smallest_partition(lis_: List[int],
         E.g. ([[12], [5, 7], [13, 6, 5]], 24)
         If two or more partitions are found that satisfy the requirements,
         the one containing the highest number of sub-lists is returned (or
-        only the first of these is returned if there are multiple partitions
+        only one of these is returned if there are multiple partitions
         with equal numbers of sub-lists).
     """
-    for max_ in range(min_, min_+max_diff+1):
-        poss_parts = list(get_possible_partitions(lis_, min_, max_))
-        if poss_parts:
-            result = max(poss_parts, key=lambda x: len(x))
-            assert flatten(result) == lis_
-            return result, max(map(sum, result))
-    else:
+
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    lo, hi = min_, min_ + max_diff
+    best = max_parts_partition(lis_, min_, hi)
+    if best is None:
+        if time_budget is not None:
+            warnings.warn(
+                f"No possible partitions found for a list of {len(lis_)} " + \
+                f"integers with sub-list sums between {min_} and {hi}. " + \
+                "Using greedy_partition, whose sub-list sums may exceed " + \
+                f"{hi}."
+            )
+            result = greedy_partition(lis_, min_)
+            return result, max(map(sum, result), default=0)
         raise ValueError(
             f"No possible partitions found for the list {lis_} with sub-list " + \
-            f"sums between {min_} and {max_diff}. Try increasing max_diff."
+            f"sums between {min_} and {hi}. Try increasing max_diff."
         )
+    while lo < hi:
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        mid = (lo + hi) // 2
+        result = max_parts_partition(lis_, min_, mid)
+        if result is None:
+            lo = mid + 1
+        else:
+            best, hi = result, mid
+    assert flatten(best) == lis_
+    return best, max(map(sum, best))
+
+
+# ====================
+def max_parts_partition(lis_: List[int],
+                        min_: int,
+                        max_: int) -> Optional[List[List[int]]]:
+    """Find the partition of a list of non-negative integers into the
+    largest number of contiguous sub-lists such that the sum of the integers
+    in each sub-list is between min_ and max_ (inclusive).
+
+    Uses dynamic programming over prefix sums. Because the prefix sums are
+    non-decreasing, the valid start positions for a sub-list ending at each
+    position form a sliding window, so the running time is O(n).
+
+    Args:
+      lis_ (List[int]):
+        A list of non-negative integers (e.g. [12, 5, 7, 13, 6, 5])
+      min_ (int):
+        The minimum value for the sum of the integers in any sub-list.
+      max_ (int):
+        The maximum value for the sum of the integers in any sub-list.
+
+    Returns:
+      Optional[List[List[int]]]:
+        The partition, or None if there is no partition that satisfies
+        the requirements.
+    """
+
+    n = len(lis_)
+    prefix = [0] + list(accumulate(lis_))
+    # most_parts[j] is the largest number of sub-lists lis_[:j] can be
+    # split into, or -1 if it cannot be split at all
+    most_parts = [0] + [-1] * n
+    prev_cut = [-1] * (n + 1)
+    # Start positions i < j with min_ <= prefix[j] - prefix[i] <= max_,
+    # in increasing order of i and decreasing order of most_parts[i]
+    window = deque()
+    next_i = 0
+    for j in range(1, n + 1):
+        while next_i < j and prefix[j] - prefix[next_i] >= min_:
+            if most_parts[next_i] >= 0:
+                while window and most_parts[window[-1]] <= most_parts[next_i]:
+                    window.pop()
+                window.append(next_i)
+            next_i += 1
+        while window and prefix[j] - prefix[window[0]] > max_:
+            window.popleft()
+        if window:
+            most_parts[j] = most_parts[window[0]] + 1
+            prev_cut[j] = window[0]
+    if n == 0 or most_parts[n] < 0:
+        return None
+    partition = []
+    j = n
+    while j > 0:
+        partition.append(lis_[prev_cut[j]:j])
+        j = prev_cut[j]
+    return partition[::-1]
+
+
+# ====================
+def greedy_partition(lis_: List[int], min_: int) -> List[List[int]]:
+    """Partition a list of integers by closing each sub-list as soon as its
+    sum reaches min_. Any remainder with a sum less than min_ is added to
+    the last sub-list. Runs in O(n) time but does not minimise the maximum
+    sub-list sum.
+
+    Args:
+      lis_ (List[int]):
+        A list of non-negative integers (e.g. [12, 5, 7, 13, 6, 5])
+      min_ (int):
+        The minimum value for the sum of the integers in any sub-list
+        (except when the sum of the whole list is less than min_).
+
+    Returns:
+      List[List[int]]:
+        The partition. E.g. [[12], [5, 7], [13], [6, 5]] for min_=11.
+    """
+
+    partition = []
+    current = []
+    current_sum = 0
+    for x in lis_:
+        current.append(x)
+        current_sum += x
+        if current_sum >= min_:
+            partition.append(current)
+            current = []
+            current_sum = 0
+    if current:
+        if partition:
+            partition[-1].extend(current)
+        else:
+            partition.append(current)
+    return partition
 
 
 # ====================
@@ -118,11 +252,48 @@ def get_possible_partitions(remaining: list,
             )
 
 
+# ====================
+def get_para_idxs(sent_token_counts: List[int],
+                  min_len: int,
+                  max_diff: int = 100,
+                  time_budget: Optional[float] = None) -> List[int]:
+    """Get the pseudo-paragraph index of each sentence in a document based on
+    the optimal partition found by get_smallest_partition.
+
+    Args:
+      sent_token_counts (List[int]):
+        The number of tokens in each sentence of the document
+      min_len (int):
+        The minimum token length of any pseudo-paragraph.
+      max_diff (int, optional):
+        The maximum number of tokens by which a pseudo-paragraph may differ
+        from min_len. Defaults to 100.
+      time_budget (Optional[float], optional):
+        The time budget for the partition search (see get_smallest_partition).
+        Defaults to None.
+
+    Returns:
+      List[int]:
+        The pseudo-paragraph index of each sentence. E.g. [0, 1, 1, 2, 2, 2]
+    """
+
+    partition, _ = get_smallest_partition(
+        sent_token_counts, min_=min_len, max_diff=max_diff, time_budget=time_budget
+    )
+    return [
+        para_idx
+        for para_idx, sent_lengths in enumerate(partition)
+        for _ in sent_lengths
+    ]
+
+
 # ====================
 def add_para_labels(df: pd.DataFrame,
                     col_label: str,
                     min_len: int,
-                    max_diff: int = 100) -> pd.DataFrame:
+                    max_diff: int = 100,
+                    n_jobs: Optional[int] = None,
+                    time_budget: Optional[float] = None) -> pd.DataFrame:
     """Add paragraph labels to sentences in a pandas DataFrame such that
     each pseudo-paragraph contains at least min_len tokens but no more than
     max_diff+min_len tokens.
@@ -130,30 +301,60 @@ def add_para_labels(df: pd.DataFrame,
     Args:
       df (pd.DataFrame):
         A pandas DataFrame. Must contain a column named 'doc_idx' specifying
-        to which document each sentence belongs.
+        to which document each sentence belongs. Sentences of the same
+        document are assumed to be in order.
       col_label (str):
-        The name of the column on which to base token counts.
+        The name of the column on which to base token counts. If the
+        DataFrame has a token count column for it (see
+        add_token_count_cols), the counts in that column are used.
       min_len (int):
         The minimum token length of any pseudo-paragraph.
       max_diff (int, optional): 
         The maximum number of tokens by which a pseudo-paragraph may differ
         from min_len. Defaults to 100.
+      n_jobs (Optional[int], optional):
+        The number of processes to partition documents in (see get_n_jobs).
+        Defaults to None (partition documents in this process).
+      time_budget (Optional[float], optional):
+        The time budget in seconds for partitioning each document (see
+        get_smallest_partition). If set, documents that cannot be
+        partitioned within the limits are partitioned greedily with a
+        warning, so their pseudo-paragraphs may contain more than
+        min_len+max_diff tokens. Defaults to None (no limit, and such
+        documents raise ValueError).
 
     Returns:
       pd.DataFrame:
-        The original DataFrame with a new column named 'para_idx' appended.
+        The original DataFrame with a new integer column named 'para_idx'
+        appended.
     """    
-    
-    doc_idxs = set(df['doc_idx'].to_list())
-    for doc_idx in doc_idxs:
-        doc_df = df[df['doc_idx'] == doc_idx]
-        sent_idxs = doc_df.index.to_list()
-        token_counts = [num_tokens(df.iloc[sent_idx][col_label]) for sent_idx in sent_idxs]
-        partition, _ = get_smallest_partition(token_counts, min_=min_len, max_diff=max_diff)
-        for para_idx, sent_lengths in enumerate(partition):
-            for _ in range(len(sent_lengths)):
-                df.at[sent_idxs.pop(0), 'para_idx'] = para_idx
-    return df
 
-
-# ====================
+    count_col_label = token_count_col_label(col_label)
+    if count_col_label in df.columns:
+        counts = df[count_col_label].to_numpy()
+    else:
+        counts = token_counts(df[col_label])
+    doc_positions = list(df.groupby('doc_idx', sort=False).indices.values())
+    doc_counts = [counts[positions].tolist() for positions in doc_positions]
+    get_doc_para_idxs = partial(
+        get_para_idxs, min_len=min_len, max_diff=max_diff, time_budget=time_budget
+    )
+    n_jobs = get_n_jobs(n_jobs)
+    if n_jobs == 1:
+        doc_para_idxs = list(map(get_doc_para_idxs, doc_counts))
+    else:
+        chunksize = max(1, len(doc_counts) // (n_jobs * 4))
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            doc_para_idxs = list(
+                executor.map(get_doc_para_idxs, doc_counts, chunksize=chunksize)
+            )
+    para_idxs = np.full(len(df), -1, dtype='int64')
+    for positions, para_idxs_ in zip(doc_positions, doc_para_idxs):
+        para_idxs[positions] = para_idxs_
+    unlabelled = para_idxs == -1
+    if unlabelled.any():
+        # Sentences that do not belong to any document
+        para_idxs = pd.array(para_idxs, dtype='Int64')
+        para_idxs[unlabelled] = pd.NA
+    df['para_idx'] = para_idxs
+    return df
@@ -0,0 +1,85 @@
+import importlib
+import sys
+from types import ModuleType
+from typing import Dict, List
+
+
+# ====================
+class LazyModule(ModuleType):
+    """A package module whose public names are imported from its submodules
+    on first access rather than when the package is imported (PEP 562), so
+    that heavy dependencies (e.g. matplotlib, spaCy, scikit-learn) are only
+    loaded when something that needs them is used.
+
+    Install with lazy_package in the package's __init__.py.
+    """
+
+    # ====================
+    def __getattr__(self, name: str):
+
+        submodule = self._lazy_names.get(name)
+        if submodule is not None:
+            value = getattr(self._import_submodule(submodule), name)
+        elif name in self._lazy_submodules:
+            value = self._import_submodule(name)
+        else:
+            # Unknown names are not looked up in the submodules, so that
+            # probes such as hasattr or tab completion import nothing
+            raise AttributeError(
+                f"module '{self.__name__}' has no attribute '{name}'"
+            )
+        # Cache the value so that this method is not called again for name
+        ModuleType.__setattr__(self, name, value)
+        return value
+
+    # ====================
+    def __setattr__(self, name: str, value):
+
+        # The import system binds each submodule to the package once it has
+        # been imported. Where a submodule defines a public name that is the
+        # same as its own (e.g. train_test_split), bind that instead, as the
+        # star imports this replaces did.
+        if isinstance(value, ModuleType) and self._lazy_names.get(name) == name \
+                and value.__name__ == f'{self.__name__}.{name}':
+            value = getattr(value, name)
+        ModuleType.__setattr__(self, name, value)
+
+    # ====================
+    def __dir__(self) -> List[str]:
+
+        return sorted(set(
+            list(self.__dict__) + list(self._lazy_names) + list(self._lazy_submodules)
+        ))
+
+    # ====================
+    def _import_submodule(self, submodule: str) -> ModuleType:
+
+        return importlib.import_module(f'{self.__name__}.{submodule}')
+
+
+# ====================
+def lazy_package(package_name: str, submodules: Dict[str, List[str]]):
+    """Make the public names of a package's submodules available as
+    attributes of the package without importing the submodules until the
+    names are first used.
+
+    Args:
+      package_name (str):
+        The name of the package (__name__ in its __init__.py)
+      submodules (Dict[str, List[str]]):
+        The public names defined in each submodule, in the order in which
+        the submodules would be star-imported (names defined in more than
+        one submodule are taken from the last one). Names that a submodule
+        only imports (e.g. pd) are not exported unless listed here.
+    """
+
+    module = sys.modules[package_name]
+    lazy_names = {
+        name: submodule
+        for submodule, names in submodules.items()
+        for name in names
+    }
+    module.__dict__['_lazy_names'] = lazy_names
+    module.__dict__['_lazy_submodules'] = dict(submodules)
+    module.__dict__['__all__'] = list(lazy_names)
+    module.__class__ = LazyModule
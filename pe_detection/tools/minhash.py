@@ -0,0 +1,200 @@
+import zlib
+from math import ceil
+from typing import List, NamedTuple, Sequence
+
+import numpy as np
+
+# Signatures use universal hash functions (a * x + b) mod PRIME, where
+# x is a 32-bit n-gram hash, so that a * x + b fits in 64 bits
+PRIME = (1 << 31) - 1
+
+
+# ====================
+class MinHashSketches(NamedTuple):
+    """MinHash sketches of the n-gram sets of a sequence of texts.
+
+    Attributes:
+      signatures (np.ndarray):
+        A uint32 array of shape (number of texts, num_perm)
+      sizes (np.ndarray):
+        The number of distinct n-grams in each text
+      n (int):
+        The number of tokens per n-gram
+      seed (int):
+        The seed used to generate the hash functions. Only sketches with the
+        same n, seed and num_perm can be compared.
+    """
+
+    signatures: np.ndarray
+    sizes: np.ndarray
+    n: int
+    seed: int
+
+
+# ====================
+def num_perm_for_error(error: float) -> int:
+    """Get the number of hash functions needed for the standard error of a
+    MinHash Jaccard similarity estimate to be no greater than error.
+
+    The standard error with k hash functions is sqrt(J * (1 - J) / k), which
+    is at most 1 / (2 * sqrt(k)).
+
+    Args:
+      error (float):
+        The maximum standard error (e.g. 0.05)
+
+    Returns:
+      int:
+        The number of hash functions (e.g. 100 for error=0.05)
+    """
+
+    if not 0 < error < 1:
+        raise ValueError(f"error should be between 0 and 1, not {error}.")
+    return ceil(1 / (4 * error ** 2))
+
+
+# ====================
+def stable_ngram_hashes(tokens: List[str], n: int) -> np.ndarray:
+    """Get the distinct 32-bit hashes of the non-overlapping n-grams in a
+    list of tokens (see transform_data.ngram_hashes). Unlike Python's hash,
+    the hashes are the same in every process.
+
+    Args:
+      tokens (List[str]):
+        The tokens
+      n (int):
+        The number of tokens per n-gram
+
+    Returns:
+      np.ndarray:
+        A sorted uint64 array of distinct n-gram hashes
+    """
+
+    ngrams = [' '.join(tokens[i:i+n]) for i in range(0, len(tokens), n)]
+    remainder = len(tokens) % n
+    if remainder:
+        # Padding, as for the last n-gram in ngram_hashes
+        ngrams[-1] += '\x00' * (n - remainder)
+    return np.unique(np.fromiter(
+        (zlib.crc32(ngram.encode('utf-8')) for ngram in ngrams),
+        dtype='uint64', count=len(ngrams)
+    ))
+
+
+# ====================
+def minhash_sketches(texts: Sequence[str],
+                     n: int,
+                     num_perm: int = 100,
+                     seed: int = 1,
+                     max_block: int = 2 ** 22) -> MinHashSketches:
+    """Compute MinHash sketches of the n-gram sets of a sequence of texts.
+
+    Args:
+      texts (Sequence[str]):
+        The texts
+      n (int):
+        The number of tokens per n-gram
+      num_perm (int, optional):
+        The number of hash functions (see num_perm_for_error).
+        Defaults to 100.
+      seed (int, optional):
+        The seed used to generate the hash functions. Defaults to 1.
+      max_block (int, optional):
+        The maximum number of hash values to compute at once, which bounds
+        memory use to about 8 * max_block bytes. Defaults to 2 ** 22.
+
+    Returns:
+      MinHashSketches:
+        The sketches
+    """
+
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, PRIME, size=num_perm).astype('uint64')[:, None]
+    b = rng.randint(0, PRIME, size=num_perm).astype('uint64')[:, None]
+    hashes = [stable_ngram_hashes(text.split(), n) for text in texts]
+    sizes = np.fromiter(map(len, hashes), dtype='uint32', count=len(hashes))
+    # Texts without n-grams keep the maximum value in every position
+    signatures = np.full((len(hashes), num_perm), PRIME, dtype='uint32')
+    block_size = max(1, max_block // num_perm)
+    start = 0
+    while start < len(hashes):
+        # Take texts until the block holds block_size n-gram hashes
+        end = start
+        total = 0
+        while end < len(hashes) and (end == start or total + sizes[end] <= block_size):
+            total += sizes[end]
+            end += 1
+        rows = [i for i in range(start, end) if sizes[i]]
+        if rows:
+            values = np.concatenate([hashes[i] for i in rows])
+            offsets = np.zeros(len(rows), dtype='int64')
+            offsets[1:] = np.cumsum(sizes[rows], dtype='int64')[:-1]
+            permuted = (a * values[None, :] + b) % PRIME
+            signatures[rows] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        start = end
+    return MinHashSketches(signatures, sizes, n, seed)
+
+
+# ====================
+def concat_sketches(sketches: List[MinHashSketches]) -> MinHashSketches:
+    """Join sketches of consecutive chunks of texts (e.g. computed in
+    separate processes) into the sketches of all of the texts.
+
+    Args:
+      sketches (List[MinHashSketches]):
+        The sketches of each chunk, all with the same n, seed and num_perm
+
+    Returns:
+      MinHashSketches:
+        The same sketches as minhash_sketches gives for all of the texts
+    """
+
+    if len({(s.n, s.seed, s.signatures.shape[1]) for s in sketches}) > 1:
+        raise ValueError(
+            "Sketches can only be joined if they were computed with the " + \
+            "same n, seed and num_perm."
+        )
+    return sketches[0]._replace(
+        signatures=np.concatenate([s.signatures for s in sketches]),
+        sizes=np.concatenate([s.sizes for s in sketches])
+    )
+
+
+# ====================
+def estimate_overlaps(sketches1: MinHashSketches,
+                      sketches2: MinHashSketches) -> np.ndarray:
+    """Estimate the proportion of the n-grams in each text of sketches1 that
+    also occur in the corresponding text of sketches2, as in
+    transform_data.ngram_overlap.
+
+    The Jaccard similarity J is estimated from the sketches, and since
+    |A & B| = J * (|A| + |B|) / (1 + J), the overlap |A & B| / |A| follows
+    from the exact set sizes stored with the sketches. Its error is that of
+    J times at most (|A| + |B|) / |A|.
+
+    Args:
+      sketches1 (MinHashSketches):
+        The sketches of the texts to compare
+      sketches2 (MinHashSketches):
+        The sketches of the texts to compare them to
+
+    Returns:
+      np.ndarray:
+        The estimated overlaps (0.0 for texts in sketches1 without n-grams)
+    """
+
+    if (sketches1.n, sketches1.seed, sketches1.signatures.shape) != \
+            (sketches2.n, sketches2.seed, sketches2.signatures.shape):
+        raise ValueError(
+            "Sketches can only be compared if they were computed for the " + \
+            "same number of texts with the same n, seed and num_perm."
+        )
+    jaccard = (sketches1.signatures == sketches2.signatures).mean(axis=1)
+    sizes1 = sketches1.sizes.astype('float64')
+    sizes2 = sketches2.sizes.astype('float64')
+    intersection = np.minimum(
+        jaccard * (sizes1 + sizes2) / (1 + jaccard), np.minimum(sizes1, sizes2)
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        overlaps = np.where(sizes1 > 0, intersection / sizes1, 0.0)
+    return overlaps
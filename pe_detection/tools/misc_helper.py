@@ -1,3 +1,7 @@
+import os
+from typing import Optional
+
+
 # ====================
 def get_digits(string: str) -> str:
     """Get only the digits from a string
@@ -11,4 +15,33 @@ def get_digits(string: str) -> str:
         Only the digits part of the string (e.g. "123")
     """    
 
-    return ''.join([c for c in string if c.isdigit()])
\ No newline at end of file
+    return ''.join([c for c in string if c.isdigit()])
+
+
+# ====================
+def get_n_jobs(n_jobs: Optional[int]) -> int:
+    """Get the number of worker processes to use, following the
+    scikit-learn/joblib convention for n_jobs arguments.
+
+    Args:
+      n_jobs (Optional[int]):
+        None or 1 for no parallelism, a positive integer for that many
+        workers, or a negative integer for the number of CPUs plus one plus
+        n_jobs (e.g. -1 for all CPUs, -2 for all CPUs but one).
+
+    Raises:
+      ValueError:
+        If n_jobs is 0.
+
+    Returns:
+      int:
+        The number of workers (at least 1)
+    """
+
+    if n_jobs is None:
+        return 1
+    if n_jobs == 0:
+        raise ValueError("n_jobs should not be 0.")
+    if n_jobs < 0:
+        return max((os.cpu_count() or 1) + 1 + n_jobs, 1)
+    return n_jobs
@@ -1,5 +1,11 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+
+import numpy as np
 import pandas as pd
 
+from pe_detection.tools.misc_helper import get_n_jobs
+
 
 # ====================
 def num_tokens(doc: str) -> int:
@@ -18,6 +24,68 @@ def num_tokens(doc: str) -> int:
     return len(doc.split())
 
 
+# ====================
+def token_counts(docs: Sequence[str],
+                 n_jobs: Optional[int] = None,
+                 chunksize: int = 100_000) -> np.ndarray:
+    """Get the number of tokens in each of a sequence of documents, as
+    defined in num_tokens.
+
+    The counts are computed in a single C-level loop over the documents,
+    without calling a Python function per document.
+
+    Args:
+      docs (Sequence[str]):
+        The documents (e.g. a pandas Series of strings)
+      n_jobs (Optional[int], optional):
+        The number of processes to count tokens in, in chunks of chunksize
+        documents (see get_n_jobs). Only worthwhile for very large inputs,
+        since the documents have to be sent to the worker processes.
+        Defaults to None (count in this process).
+      chunksize (int, optional):
+        The number of documents per chunk when n_jobs is used.
+        Defaults to 100,000.
+
+    Returns:
+      np.ndarray:
+        An int64 array of token counts
+    """
+
+    n_jobs = get_n_jobs(n_jobs)
+    if n_jobs == 1 or len(docs) <= chunksize:
+        return np.fromiter(
+            map(len, map(str.split, docs)), dtype='int64', count=len(docs)
+        )
+    if isinstance(docs, pd.Series):
+        docs = docs.to_numpy()
+    chunks = [docs[i:i+chunksize] for i in range(0, len(docs), chunksize)]
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return np.concatenate(list(executor.map(token_counts, chunks)))
+
+
+# ====================
+def compact_int_dtype(counts: np.ndarray) -> np.ndarray:
+    """Convert an array of non-negative integers to the smallest signed
+    integer type that can hold all of its values. Signed types are used so
+    that differences between arrays (e.g. between the token counts of two
+    columns) can be negative instead of wrapping around.
+
+    Args:
+      counts (np.ndarray):
+        An array of non-negative integers
+
+    Returns:
+      np.ndarray:
+        The array as int8, int16, int32 or int64
+    """
+
+    max_ = int(counts.max()) if len(counts) else 0
+    for dtype in [np.int8, np.int16, np.int32]:
+        if max_ <= np.iinfo(dtype).max:
+            return counts.astype(dtype)
+    return counts.astype(np.int64)
+
+
 # ====================
 def alpha_part(str_: str) -> str:
 
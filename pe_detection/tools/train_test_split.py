@@ -1,8 +1,13 @@
+import heapq
+from bisect import bisect_left
+from math import ceil, floor
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
-from pe_detection.tools.text_helper import num_tokens
+from pe_detection.tools.df_helper import token_count_col_label
+from pe_detection.tools.text_helper import token_counts
 
 
 # ====================
@@ -10,6 +15,9 @@ def get_doc_token_counts(df: pd.DataFrame, col_label: str) -> Dict[int, int]:
     """Return a dictonary containing the number of tokens in each document
     in the DataFrame based on the 'doc_idx' column.
 
+    If the DataFrame has a token count column for col_label (see
+    add_token_count_cols), the counts in that column are used.
+
     Args:
       df (pd.DataFrame):
         A pandas DataFrame in which each row contains a sentence or (pseudo-)
@@ -24,22 +32,57 @@ def get_doc_token_counts(df: pd.DataFrame, col_label: str) -> Dict[int, int]:
         of tokens in the specified column for the corresponding document.
     """    
 
-    doc_idxs = df['doc_idx'].to_list()
-    token_counts = {}
-    for doc_idx in doc_idxs:
-        token_counts[int(doc_idx)] \
-            = num_tokens(''.join(df[df['doc_idx'] == doc_idx][col_label].to_list()))
-    return token_counts
-    
+    doc_counts = get_doc_token_counts_df(df, [col_label])[col_label]
+    return {int(doc_idx): int(count) for doc_idx, count in doc_counts.items()}
+
+
+# ====================
+def get_doc_token_counts_df(df: pd.DataFrame,
+                            col_labels: List[str]) -> pd.DataFrame:
+    """Get the number of tokens in each document for several text columns
+    with a single groupby over the 'doc_idx' column.
+
+    Token count columns added by add_token_count_cols are used where they
+    exist.
+
+    Args:
+      df (pd.DataFrame):
+        A pandas DataFrame in which each row contains a sentence or (pseudo-)
+        paragraph and which has a 'doc_idx' column.
+      col_labels (List[str]):
+        The labels of the text columns to get token counts for.
+
+    Returns:
+      pd.DataFrame:
+        A DataFrame indexed by document index with a column of token counts
+        for each of col_labels.
+    """
+
+    counts = pd.DataFrame({
+        col_label: (
+            df[token_count_col_label(col_label)].to_numpy()
+            if token_count_col_label(col_label) in df.columns
+            else token_counts(df[col_label])
+        )
+        for col_label in col_labels
+    })
+    return counts.groupby(df['doc_idx'].to_numpy()).sum().rename_axis('doc_idx')
+
 
 # ====================
 def best_split(doc_token_counts: Dict[int, int],
                desired_test_ratio: float,
-               must_be_train: Optional[List[int]] = None
+               must_be_train: Optional[List[int]] = None,
+               max_dp_tokens: int = 50_000_000
                ) -> Tuple[List[int], List[int], float]:
     """Return the train/test split for which the ratio of document tokens
     in test/train sets is the closest to desired_test_ratio
 
+    The best split is found with closest_subset_sum, which takes time
+    proportional to the number of documents times the number of tokens.
+    If the documents that may be in the test set contain more than
+    max_dp_tokens tokens in total, greedy_subset_sum is used instead.
+
     Args:
       doc_token_counts (Dict[int, int]):
         A dictionary of document token counts (can be obtained using
@@ -49,6 +92,13 @@ def best_split(doc_token_counts: Dict[int, int],
       must_be_train (Optional[List[int]], optional):
         A list of document indices that must not be included in the
         test set. Defaults to None.
+      max_dp_tokens (int, optional):
+        The maximum total number of tokens for which to find the exact best
+        split. Defaults to 50,000,000.
+
+    Raises:
+      ValueError:
+        If the documents do not contain any tokens.
 
     Returns:
       Tuple[List[int], List[int], float]:
@@ -59,21 +109,138 @@ def best_split(doc_token_counts: Dict[int, int],
 
     if must_be_train is None:
         must_be_train = []
-    num_docs = len(doc_token_counts.keys())
+    must_be_train = set(must_be_train)
+    doc_idxs = sorted(doc_token_counts.keys())
     total_toks = sum(doc_token_counts.values())
-    splits = []
-    # Iterate over binary numbers from 0*num_docs to 1*num_docs
-    for i in range(int('1' * num_docs, 2)):
-        # Remove '0b' from start of binary string
-        bin_ = bin(i)[2:].zfill(num_docs)
-        train = [doc_idx for doc_idx in range(num_docs) if bin_[doc_idx] == '0']
-        test = [doc_idx for doc_idx in range(num_docs) if bin_[doc_idx] == '1']
-        if any([doc_idx in must_be_train for doc_idx in test]):
+    if total_toks == 0:
+        raise ValueError("The documents do not contain any tokens.")
+    # Documents without tokens do not change the ratio, so they are left in
+    # the train set
+    candidates = [
+        d for d in doc_idxs
+        if d not in must_be_train and doc_token_counts[d] > 0
+    ]
+    counts = [int(doc_token_counts[d]) for d in candidates]
+    target = desired_test_ratio * total_toks
+    # Not every document can be in the test set
+    max_sum = total_toks - 1 if len(candidates) == len(doc_idxs) else None
+    if sum(counts) <= max_dp_tokens:
+        chosen = closest_subset_sum(counts, target, max_sum)
+    else:
+        chosen = greedy_subset_sum(counts, target, max_sum)
+    test = sorted(candidates[i] for i in chosen)
+    test_set = set(test)
+    train = [d for d in doc_idxs if d not in test_set]
+    test_toks = sum(counts[i] for i in chosen)
+    return train, test, test_toks / total_toks
+
+
+# ====================
+def closest_subset_sum(counts: List[int],
+                       target: float,
+                       max_sum: Optional[int] = None) -> List[int]:
+    """Find the subset of a list of non-negative integers whose sum is
+    closest to a target value, using dynamic programming over all reachable
+    sums in O(len(counts) * sum(counts)) time and O(sum(counts)) memory.
+
+    For each reachable sum, only the last item that was added to reach it
+    is stored, which is enough to reconstruct one subset with that sum.
+    The search stops early once the integer sum nearest to the target is
+    reachable, since no other sum can be closer.
+
+    Args:
+      counts (List[int]):
+        The integers (e.g. document token counts)
+      target (float):
+        The target sum
+      max_sum (Optional[int], optional):
+        The maximum sum allowed. Defaults to None (no maximum).
+
+    Returns:
+      List[int]:
+        The indices in counts of the items in the subset
+    """
+
+    total = sum(counts)
+    reachable = np.zeros(total + 1, dtype=bool)
+    reachable[0] = True
+    last_item = np.full(total + 1, -1, dtype='int64')
+    reach_max = 0
+    upper = total if max_sum is None else min(total, max_sum)
+    nearest = min(
+        {min(max(floor(target), 0), upper), min(max(ceil(target), 0), upper)},
+        key=lambda s: abs(s - target)
+    )
+    for item, count in enumerate(counts):
+        if count == 0:
             continue
-        test_toks = sum([doc_token_counts[x] for x in test])
-        actual_ratio = test_toks / total_toks
-        splits.append((train, test, actual_ratio))
-    return min(splits, key=lambda x: abs(x[2] - desired_test_ratio))
+        # Sums that become reachable for the first time by adding this item
+        new = np.flatnonzero(
+            reachable[:reach_max+1] & ~reachable[count:reach_max+count+1]
+        ) + count
+        reachable[new] = True
+        last_item[new] = item
+        reach_max += count
+        if nearest >= 0 and reachable[nearest]:
+            break
+    sums = np.flatnonzero(reachable)
+    if max_sum is not None:
+        sums = sums[sums <= max_sum]
+    best_sum = int(sums[np.argmin(np.abs(sums - target))])
+    chosen = []
+    while best_sum > 0:
+        item = int(last_item[best_sum])
+        chosen.append(item)
+        best_sum -= counts[item]
+    return sorted(chosen)
+
+
+# ====================
+def greedy_subset_sum(counts: List[int],
+                      target: float,
+                      max_sum: Optional[int] = None) -> List[int]:
+    """Find a subset of a list of non-negative integers whose sum is close to
+    a target value by adding items from largest to smallest as long as the
+    sum does not exceed the target, in O(n log n) time.
+
+    Unless every item fits, the sum then falls short of the target by less
+    than the smallest item left out. Finally, the single left-out item that
+    brings the sum closest to the target is added if that improves the
+    result.
+
+    Args:
+      counts (List[int]):
+        The integers (e.g. document token counts)
+      target (float):
+        The target sum
+      max_sum (Optional[int], optional):
+        The maximum sum allowed. Defaults to None (no maximum).
+
+    Returns:
+      List[int]:
+        The indices in counts of the items in the subset
+    """
+
+    limit = target if max_sum is None else min(target, max_sum)
+    chosen = []
+    left_out = []
+    sum_ = 0
+    for item in sorted(range(len(counts)), key=lambda i: -counts[i]):
+        if sum_ + counts[item] <= limit:
+            chosen.append(item)
+            sum_ += counts[item]
+        else:
+            left_out.append(item)
+    improvements = [
+        item for item in left_out
+        if abs(sum_ + counts[item] - target) < abs(sum_ - target)
+        and (max_sum is None or sum_ + counts[item] <= max_sum)
+    ]
+    if improvements:
+        chosen.append(min(
+            improvements, key=lambda item: abs(sum_ + counts[item] - target)
+        ))
+    return sorted(chosen)
 
 
 # ====================
@@ -99,6 +266,7 @@ def n_best_splits(doc_token_counts: Dict[int, int],
         the train set, a list of document indices in the test set,
         and the ratio of tokens between the test and train sets.
         The splits are ordered from best to worst.
+        See balanced_folds for splits that are all close to a ratio of 1/k.
     """                  
 
     best_splits = []
@@ -116,6 +284,134 @@ def n_best_splits(doc_token_counts: Dict[int, int],
     return best_splits
 
 
+# ====================
+def balanced_folds(doc_token_counts: Dict[int, int],
+                   k: int,
+                   max_iter: Optional[int] = None
+                   ) -> List[Tuple[List[int], List[int], float]]:
+    """Assign every document to one of k test folds such that the number of
+    tokens in each fold is as close as possible to 1/k of the total.
+
+    Documents are first assigned from largest to smallest to the fold with
+    the fewest tokens so far (the LPT heuristic for multi-way number
+    partitioning). The difference between the largest and smallest folds is
+    then reduced by moving a single document or swapping a pair of documents
+    between them until no move or swap improves it. Unlike n_best_splits,
+    all folds are built together, so later folds are no worse than earlier
+    ones.
+
+    Args:
+      doc_token_counts (Dict[int, int]):
+        A dictionary of document token counts (can be obtained using
+        get_doc_token_counts).
+      k (int):
+        The number of folds.
+      max_iter (Optional[int], optional):
+        The maximum number of improvement steps after the initial
+        assignment. Defaults to None (10 times the number of documents).
+
+    Returns:
+      List[Tuple[List[int], List[int], float]]:
+        A list of k tuples each containing a list of document indices in
+        the train set, a list of document indices in the test set, and the
+        ratio of tokens between the test set and all documents. Each
+        document is in exactly one test set. The document lists can be
+        passed to train_test_df_to_xy_dfs as train_docs and test_docs.
+    """
+
+    doc_idxs = sorted(doc_token_counts.keys())
+    if not 1 <= k <= len(doc_idxs):
+        raise ValueError(
+            f"k should be between 1 and the number of documents " + \
+            f"({len(doc_idxs)}), not {k}."
+        )
+    if max_iter is None:
+        max_iter = 10 * len(doc_idxs)
+    fold_docs = [[] for _ in range(k)]
+    fold_toks = [0] * k
+    heap = [(0, fold) for fold in range(k)]
+    for doc_idx in sorted(doc_idxs, key=lambda d: -doc_token_counts[d]):
+        toks, fold = heapq.heappop(heap)
+        fold_docs[fold].append(doc_idx)
+        fold_toks[fold] = toks + doc_token_counts[doc_idx]
+        heapq.heappush(heap, (fold_toks[fold], fold))
+    for _ in range(max_iter):
+        heavy = max(range(k), key=lambda f: fold_toks[f])
+        light = min(range(k), key=lambda f: fold_toks[f])
+        move = best_transfer(
+            [doc_token_counts[d] for d in fold_docs[heavy]],
+            [doc_token_counts[d] for d in fold_docs[light]],
+            fold_toks[heavy] - fold_toks[light]
+        )
+        if move is None:
+            break
+        from_heavy, from_light = move
+        moved_heavy = fold_docs[heavy].pop(from_heavy)
+        fold_toks[heavy] -= doc_token_counts[moved_heavy]
+        fold_toks[light] += doc_token_counts[moved_heavy]
+        fold_docs[light].append(moved_heavy)
+        if from_light is not None:
+            moved_light = fold_docs[light].pop(from_light)
+            fold_toks[light] -= doc_token_counts[moved_light]
+            fold_toks[heavy] += doc_token_counts[moved_light]
+            fold_docs[heavy].append(moved_light)
+    total_toks = sum(fold_toks)
+    folds_ = []
+    for test_docs, test_toks in zip(fold_docs, fold_toks):
+        test = sorted(test_docs)
+        test_set = set(test)
+        train = [d for d in doc_idxs if d not in test_set]
+        folds_.append((train, test, test_toks / total_toks if total_toks else 0.0))
+    return folds_
+
+
+# ====================
+def best_transfer(heavy: List[int],
+                  light: List[int],
+                  diff: int) -> Optional[Tuple[int, Optional[int]]]:
+    """Find the move of one item from a heavy bin to a light bin, or swap of
+    one item in each bin, that most reduces the difference between the
+    totals of the two bins.
+
+    Moving a net amount t from the heavy bin to the light bin changes the
+    difference from diff to |diff - 2t|, so the best transfer is the one
+    with t closest to diff / 2, and it is only an improvement if
+    0 < t < diff.
+
+    Args:
+      heavy (List[int]):
+        The sizes of the items in the bin with the larger total
+      light (List[int]):
+        The sizes of the items in the bin with the smaller total
+      diff (int):
+        The difference between the totals of the two bins
+
+    Returns:
+      Optional[Tuple[int, Optional[int]]]:
+        The index of the item to move out of the heavy bin and the index of
+        the item to move out of the light bin (or None for a move rather
+        than a swap), or None if no move or swap reduces the difference.
+    """
+
+    best = None
+    best_diff = diff
+    light_order = sorted(range(len(light)), key=lambda j: light[j])
+    light_sorted = [light[j] for j in light_order]
+    for i, size in enumerate(heavy):
+        # Single move
+        if abs(diff - 2 * size) < best_diff:
+            best, best_diff = (i, None), abs(diff - 2 * size)
+        # Swap with the item in the light bin that makes size - other
+        # closest to diff / 2
+        pos = bisect_left(light_sorted, size - diff / 2)
+        for p in (pos - 1, pos):
+            if 0 <= p < len(light_sorted):
+                new_diff = abs(diff - 2 * (size - light_sorted[p]))
+                if new_diff < best_diff:
+                    best, best_diff = (i, light_order[p]), new_diff
+    return best
+
+
 # ====================
 def train_test_split(df: pd.DataFrame,
                      doc_idxs_train: List[int]) -> Tuple[pd.DataFrame, pd.DataFrame]:
@@ -1,14 +1,23 @@
-from typing import Optional, List, Dict, Union, Tuple
-from more_itertools import windowed
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations
+from typing import Optional, List, Dict, Sequence, Union, Tuple
+
+import numpy as np
 import pandas as pd
 
 from pe_detection.tools.column_name_helper import get_column_name
+from pe_detection.tools.interning import intern_texts
+from pe_detection.tools.minhash import (concat_sketches, estimate_overlaps,
+                                       minhash_sketches, num_perm_for_error)
+from pe_detection.tools.misc_helper import get_n_jobs
+from pe_detection.tools.xy_view import XYView
 
 
 # ====================
 def paras_df_to_xy_df(paras_df: pd.DataFrame,
                       cols_to_classes: Dict[str, str],
-                      cols_to_keep: Optional[Union[List[str], Dict[str, str]]] = None) -> pd.DataFrame:
+                      cols_to_keep: Optional[Union[List[str], Dict[str, str]]] = None,
+                      lazy: bool = False) -> Union[pd.DataFrame, XYView]:
     """Take data from a pandas DataFrame with columns for different
     text types and a row for each paragraph and return a DataFrame
     with paragraphs in the 'x' column and class labels in the 'y' column
@@ -28,6 +37,10 @@ def paras_df_to_xy_df(paras_df: pd.DataFrame,
         Other columns to keep in the output DataFrame. May be a list of
         column labels or a dictionary mapping existing column labels to 
         new column labels. Defaults to None.
+      lazy (bool, optional):
+        If True, return an XYView of paras_df instead of building a new
+        DataFrame, so that no text is copied until the view is iterated.
+        Defaults to False.
 
     Returns:
       pd.DataFrame:
@@ -35,6 +48,8 @@ def paras_df_to_xy_df(paras_df: pd.DataFrame,
         labels), as well as any other columns that were kept.
     """
 
+    if lazy:
+        return XYView(paras_df, cols_to_classes, cols_to_keep)
     if cols_to_keep is None:
         cols_to_keep = dict()
     elif isinstance(cols_to_keep, list):
@@ -56,8 +71,20 @@ def train_test_df_to_xy_dfs(train_test_df: pd.DataFrame,
                             cols_to_keep: Optional[Union[List[str], Dict[str, str]]] = None,
                             train_docs: Optional[List[int]] = None,
                             test_docs: Optional[List[int]] = None,
+                            lazy: bool = False
                             ) -> pd.DataFrame:
 
+    if lazy:
+        if train_docs is not None and test_docs is not None:
+            train = train_test_df['doc_idx'].isin(train_docs).to_numpy()
+            test = train_test_df['doc_idx'].isin(test_docs).to_numpy()
+        else:
+            train = (train_test_df['role'] == 'train').to_numpy()
+            test = (train_test_df['role'] == 'test').to_numpy()
+        return (
+            XYView(train_test_df, cols_to_classes, cols_to_keep, np.flatnonzero(train)),
+            XYView(train_test_df, cols_to_classes, cols_to_keep, np.flatnonzero(test))
+        )
     if train_docs is not None and test_docs is not None:
         train = train_test_df[train_test_df['doc_idx'].isin(train_docs)]
         test = train_test_df[train_test_df['doc_idx'].isin(test_docs)]
@@ -73,30 +100,324 @@ def train_test_df_to_xy_dfs(train_test_df: pd.DataFrame,
 def ngram_overlaps_df(df: pd.DataFrame,
                       x1_label: str,
                       x2_label: str,
-                      ngrams: Tuple[int, int]) -> pd.DataFrame:
+                      ngrams: Tuple[int, int],
+                      n_jobs: Optional[int] = None,
+                      chunksize: int = 10_000,
+                      method: str = 'exact',
+                      error: float = 0.05,
+                      seed: int = 1) -> pd.DataFrame:
+    """Get the n-gram overlap (see ngram_overlap) between the texts in two
+    columns of a DataFrame for each row and each n in a range.
+
+    Each text is tokenized once and the n-grams for every n are hashed from
+    the same tokens. Repeated pairs of texts are only compared once, and
+    identical texts (e.g. unedited MT output) are not compared at all. With
+    method='minhash', the overlaps are instead estimated from compact
+    MinHash sketches of each distinct text's n-gram set (see
+    minhash.estimate_overlaps), which avoids holding full n-gram sets in
+    memory.
+
+    Args:
+      df (pd.DataFrame):
+        The DataFrame
+      x1_label (str):
+        The label of the column containing the texts to compare
+      x2_label (str):
+        The label of the column containing the texts to compare them to
+      ngrams (Tuple[int, int]):
+        The smallest and largest n to get overlaps for (e.g. (1, 3))
+      n_jobs (Optional[int], optional):
+        The number of processes to compute overlaps in, in chunks of
+        chunksize distinct pairs of texts (see get_n_jobs). With
+        method='minhash', the distinct texts are sketched in chunks of
+        chunksize texts instead. Defaults to None (compute overlaps in this
+        process).
+      chunksize (int, optional):
+        The number of pairs or texts per chunk when n_jobs is used.
+        Defaults to 10,000.
+      method (str, optional):
+        'exact' to compute overlaps from full n-gram sets, or 'minhash' to
+        estimate them from sketches. Defaults to 'exact'.
+      error (float, optional):
+        For method='minhash', the maximum standard error of the Jaccard
+        similarity estimates the overlaps are derived from
+        (see minhash.num_perm_for_error). Defaults to 0.05.
+      seed (int, optional):
+        For method='minhash', the seed for the hash functions.
+        Defaults to 1.
+
+    Returns:
+      pd.DataFrame:
+        A DataFrame with a column named '<x1_label>_<x2_label>_overlap_<n>gram'
+        for each n, followed by the other columns of the original DataFrame.
+    """
 
-    overlaps_df_rows = []
+    if method not in ['exact', 'minhash']:
+        raise ValueError(f"method should be 'exact' or 'minhash', not {method}.")
     col_label_root = f"{x1_label}_{x2_label}_overlap"
-    ngram_range = range(ngrams[0], ngrams[1]+1)
-    for _, row in df.iterrows():
-        this_row = {
-            f"{col_label_root}_{n}gram": ngram_overlap(row[x1_label], row[x2_label], n)
-            for n in ngram_range
-        }
-        overlaps_df_rows.append(this_row)
-    overlaps_df = pd.DataFrame(overlaps_df_rows)
+    ns = list(range(ngrams[0], ngrams[1]+1))
+    interned = intern_texts(df, [x1_label, x2_label])
+    if (interned.codes < 0).any():
+        raise ValueError("Cannot get n-gram overlaps for missing values.")
+    uniques = interned.uniques
+    n_jobs = get_n_jobs(n_jobs)
+    if method == 'minhash':
+        num_perm = num_perm_for_error(error)
+        if n_jobs == 1 or len(uniques) <= chunksize:
+            sketches_by_n = (
+                minhash_sketches(uniques, n, num_perm, seed) for n in ns
+            )
+        else:
+            # Sketch chunks of the distinct texts for every n in parallel
+            starts = range(0, len(uniques), chunksize)
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [
+                    [
+                        executor.submit(
+                            minhash_sketches, uniques[i:i+chunksize], n,
+                            num_perm, seed
+                        )
+                        for i in starts
+                    ]
+                    for n in ns
+                ]
+                sketches_by_n = [
+                    concat_sketches([future.result() for future in futures_])
+                    for futures_ in futures
+                ]
+        overlaps = np.zeros((len(df), 0))
+        for sketches in sketches_by_n:
+            sketches1, sketches2 = [
+                sketches._replace(
+                    signatures=sketches.signatures[codes],
+                    sizes=sketches.sizes[codes]
+                )
+                for codes in interned.codes.T
+            ]
+            overlaps = np.column_stack(
+                [overlaps, estimate_overlaps(sketches1, sketches2)]
+            )
+    else:
+        # Compare each distinct pair of texts once
+        pair_idxs, pairs = pd.factorize(
+            interned.codes[:, 0] * len(uniques) + interned.codes[:, 1]
+        )
+        texts1 = uniques[pairs // len(uniques)]
+        texts2 = uniques[pairs % len(uniques)]
+        if n_jobs == 1 or len(pairs) <= chunksize:
+            overlaps = ngram_overlaps(texts1, texts2, ns)
+        else:
+            starts = range(0, len(pairs), chunksize)
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                overlaps = np.concatenate(list(executor.map(
+                    ngram_overlaps,
+                    [texts1[i:i+chunksize] for i in starts],
+                    [texts2[i:i+chunksize] for i in starts],
+                    [ns] * len(starts)
+                )))
+        overlaps = overlaps.reshape(len(pairs), len(ns))[pair_idxs]
+    overlaps_df = pd.DataFrame(
+        overlaps.reshape(len(df), len(ns)),
+        columns=[f"{col_label_root}_{n}gram" for n in ns]
+    )
     other_cols = [c for c in df.columns if c not in [x1_label, x2_label]]
     for c in other_cols:
-        overlaps_df[c] = df[c]
+        overlaps_df[c] = df[c].to_numpy()
     return overlaps_df
 
 
+# ====================
+def ngram_overlap_matrix(df: pd.DataFrame,
+                         col_labels: List[str],
+                         ngrams: Tuple[int, int],
+                         n_jobs: Optional[int] = None,
+                         chunksize: int = 10_000) -> pd.DataFrame:
+    """Get the n-gram overlap (see ngram_overlap) between every ordered pair
+    of text columns for each row and each n in a range.
+
+    In each row, each distinct text is tokenized once and its n-gram set for
+    each n is built once and shared by all of the pairs it is part of.
+    Rows whose texts all repeat an earlier row are not compared again.
+
+    Args:
+      df (pd.DataFrame):
+        The DataFrame
+      col_labels (List[str]):
+        The labels of the text columns to compare (e.g. the ht, nmt, smt,
+        penmt and pesmt columns of a language pair)
+      ngrams (Tuple[int, int]):
+        The smallest and largest n to get overlaps for (e.g. (1, 3))
+      n_jobs (Optional[int], optional):
+        The number of processes to compute overlaps in, in chunks of
+        chunksize rows (see get_n_jobs). Defaults to None (compute overlaps
+        in this process).
+      chunksize (int, optional):
+        The number of rows per chunk when n_jobs is used.
+        Defaults to 10,000.
+
+    Returns:
+      pd.DataFrame:
+        A long-format DataFrame with columns 'row' (the index label of the
+        row in df), 'x1' and 'x2' (the column compared and the column it is
+        compared to), 'n' and 'overlap', with one row for each row of df,
+        ordered pair of columns, and n.
+    """
+
+    ns = list(range(ngrams[0], ngrams[1]+1))
+    pairs = list(permutations(range(len(col_labels)), 2))
+    interned = intern_texts(df, col_labels)
+    if (interned.codes < 0).any():
+        raise ValueError("Cannot get n-gram overlaps for missing values.")
+    # Compare each distinct row of texts once
+    rows, row_idxs = np.unique(interned.codes, axis=0, return_inverse=True)
+    texts = [interned.uniques[rows[:, i]] for i in range(len(col_labels))]
+    n_jobs = get_n_jobs(n_jobs)
+    if n_jobs == 1 or len(rows) <= chunksize:
+        overlaps = pairwise_ngram_overlaps(texts, ns)
+    else:
+        starts = range(0, len(rows), chunksize)
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            overlaps = np.concatenate(list(executor.map(
+                pairwise_ngram_overlaps,
+                [[col_texts[i:i+chunksize] for col_texts in texts] for i in starts],
+                [ns] * len(starts)
+            )))
+    overlaps = overlaps.reshape(len(rows), len(pairs), len(ns))[row_idxs.reshape(-1)]
+    num_rows = len(df)
+    x1 = np.array([col_labels[i] for i, _ in pairs], dtype=object)
+    x2 = np.array([col_labels[j] for _, j in pairs], dtype=object)
+    return pd.DataFrame({
+        'row': np.repeat(df.index.to_numpy(), len(pairs) * len(ns)),
+        'x1': np.tile(np.repeat(x1, len(ns)), num_rows),
+        'x2': np.tile(np.repeat(x2, len(ns)), num_rows),
+        'n': np.tile(ns, num_rows * len(pairs)),
+        'overlap': overlaps.reshape(-1)
+    })
+
+
+# ====================
+def pairwise_ngram_overlaps(texts: List[Sequence[str]],
+                            ns: List[int]) -> np.ndarray:
+    """Get the n-gram overlap (see ngram_overlap) between the texts of every
+    ordered pair of columns in each row, building each text's n-gram sets
+    only once.
+
+    Args:
+      texts (List[Sequence[str]]):
+        The texts of each column (all of the same length)
+      ns (List[int]):
+        The values of n (e.g. [1, 2, 3])
+
+    Returns:
+      np.ndarray:
+        An array of shape (number of rows, number of ordered pairs, len(ns)),
+        with pairs in the order of itertools.permutations.
+    """
+
+    pairs = list(permutations(range(len(texts)), 2))
+    num_rows = len(texts[0]) if texts else 0
+    overlaps = np.zeros((num_rows, len(pairs), len(ns)))
+    for row, row_texts in enumerate(zip(*texts)):
+        # Position of each column's text among the distinct texts in the row
+        distinct = {}
+        text_idxs = [distinct.setdefault(text, len(distinct)) for text in row_texts]
+        tokens = [text.split() for text in distinct]
+        for k, n in enumerate(ns):
+            ngram_sets = [ngram_hashes(tokens_, n) for tokens_ in tokens]
+            for p, (i, j) in enumerate(pairs):
+                ngrams1 = ngram_sets[text_idxs[i]]
+                if not ngrams1:
+                    continue
+                if text_idxs[i] == text_idxs[j]:
+                    overlaps[row, p, k] = 1.0
+                else:
+                    overlaps[row, p, k] = \
+                        len(ngrams1.intersection(ngram_sets[text_idxs[j]])) / len(ngrams1)
+    return overlaps
+
+
+# ====================
+def ngram_overlaps(texts1: Sequence[str],
+                   texts2: Sequence[str],
+                   ns: List[int]) -> np.ndarray:
+    """Get the n-gram overlap (see ngram_overlap) between each pair of texts
+    in two sequences for several values of n, tokenizing each text once.
+
+    Args:
+      texts1 (Sequence[str]):
+        The texts to compare
+      texts2 (Sequence[str]):
+        The texts to compare them to (of the same length as texts1)
+      ns (List[int]):
+        The values of n (e.g. [1, 2, 3])
+
+    Returns:
+      np.ndarray:
+        An array of shape (len(texts1), len(ns)) containing the overlaps
+    """
+
+    overlaps = np.zeros((len(texts1), len(ns)))
+    for i, (text1, text2) in enumerate(zip(texts1, texts2)):
+        tokens1 = text1.split()
+        if text1 == text2:
+            # Every n-gram of a text occurs in the text itself
+            overlaps[i] = 1.0 if tokens1 else 0.0
+            continue
+        tokens2 = text2.split()
+        for j, n in enumerate(ns):
+            ngrams1 = ngram_hashes(tokens1, n)
+            if ngrams1:
+                overlaps[i, j] = \
+                    len(ngrams1.intersection(ngram_hashes(tokens2, n))) / len(ngrams1)
+    return overlaps
+
+
+# ====================
+def ngram_hashes(tokens: List[str], n: int) -> set:
+    """Get the set of hashes of the non-overlapping n-grams in a list of
+    tokens. The last n-gram is padded with None if the number of tokens is
+    not a multiple of n (as in more_itertools.windowed with step=n).
+
+    Args:
+      tokens (List[str]):
+        The tokens
+      n (int):
+        The number of tokens per n-gram
+
+    Returns:
+      set:
+        The set of n-gram hashes
+    """
+
+    hashes = set(map(hash, zip(*[iter(tokens)] * n)))
+    remainder = len(tokens) % n
+    if remainder:
+        hashes.add(hash(tuple(tokens[-remainder:]) + (None,) * (n - remainder)))
+    return hashes
+
+
 # ====================
 def ngram_overlap(text1, text2, n) -> float:
+    """Get the proportion of the distinct non-overlapping n-grams in text1
+    that also occur in text2.
+
+    Args:
+      text1 (str):
+        The text to compare
+      text2 (str):
+        The text to compare it to
+      n (int):
+        The number of tokens per n-gram
+
+    Returns:
+      float:
+        The overlap, or 0.0 if text1 has no tokens
+    """
 
-    ngrams1 = set(windowed(text1.split(), n=n, step=n))
-    ngrams2 = set(windowed(text2.split(), n=n, step=n))
-    ngram_overlap = len(ngrams1.intersection(ngrams2)) / len(ngrams1)
+    ngrams1 = ngram_hashes(text1.split(), n)
+    if not ngrams1:
+        return 0.0
+    ngram_overlap = len(ngrams1.intersection(ngram_hashes(text2.split(), n))) / len(ngrams1)
     return ngram_overlap
 
 
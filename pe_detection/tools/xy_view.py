@@ -0,0 +1,163 @@
+from collections.abc import Sequence
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+# ====================
+class LazyTexts(Sequence):
+    """A read-only sequence of the texts in several columns of a DataFrame
+    at the given row positions, column after column, that does not copy any
+    text until it is iterated or indexed. Can be passed as X to scikit-learn
+    text vectorizers and pipelines.
+
+    Args:
+      df (pd.DataFrame):
+        The DataFrame containing the texts
+      col_labels (List[str]):
+        The labels of the text columns, in order
+      positions (np.ndarray):
+        The integer positions of the rows to include
+    """
+
+    def __init__(self,
+                 df: pd.DataFrame,
+                 col_labels: List[str],
+                 positions: np.ndarray):
+
+        self.df = df
+        self.col_labels = col_labels
+        self.positions = positions
+
+    # ====================
+    def __len__(self) -> int:
+
+        return len(self.col_labels) * len(self.positions)
+
+    # ====================
+    def __getitem__(self, idx: Union[int, slice]):
+
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('LazyTexts index out of range')
+        col_idx, row_idx = divmod(idx, len(self.positions))
+        return self.df[self.col_labels[col_idx]].iat[self.positions[row_idx]]
+
+    # ====================
+    def __iter__(self) -> Iterator[str]:
+
+        for col in self.col_labels:
+            yield from self.df[col].to_numpy()[self.positions]
+
+    # ====================
+    def to_list(self) -> List[str]:
+
+        return list(self)
+
+
+# ====================
+class XYView:
+    """A long-format view of a DataFrame with a column for each text type,
+    equivalent to the DataFrame returned by paras_df_to_xy_df but without
+    copying any text.
+
+    The view stores only the row positions it covers. Its 'x' column is a
+    LazyTexts sequence and its 'y' column is a categorical Series, so it can
+    be used in place of the materialized DataFrame by train_tfidf_count_clf
+    and evaluate_clf, or converted with to_frame.
+
+    Args:
+      df (pd.DataFrame):
+        The DataFrame containing columns for different text types and a
+        row for each paragraph
+      cols_to_classes (Dict[str, str]):
+        The mapping of column labels to class labels
+        (see paras_df_to_xy_df).
+      cols_to_keep (Optional[Union[List[str], Dict[str, str]]], optional):
+        Other columns to include in the view, as a list of column labels
+        or a dictionary mapping existing column labels to new column
+        labels. Defaults to None.
+      positions (Optional[np.ndarray], optional):
+        The integer positions of the rows of df to include.
+        Defaults to None (all rows).
+    """
+
+    def __init__(self,
+                 df: pd.DataFrame,
+                 cols_to_classes: Dict[str, str],
+                 cols_to_keep: Optional[Union[List[str], Dict[str, str]]] = None,
+                 positions: Optional[np.ndarray] = None):
+
+        if cols_to_keep is None:
+            cols_to_keep = dict()
+        elif isinstance(cols_to_keep, list):
+            cols_to_keep = {x: x for x in cols_to_keep}
+        self.df = df
+        self.cols_to_classes = dict(cols_to_classes)
+        self.cols_to_keep = cols_to_keep
+        self.positions = (
+            np.arange(len(df)) if positions is None
+            else np.asarray(positions, dtype='int64')
+        )
+
+    # ====================
+    @property
+    def columns(self) -> List[str]:
+
+        return list(self.cols_to_keep.values()) + ['x', 'y']
+
+    # ====================
+    def __len__(self) -> int:
+
+        return len(self.cols_to_classes) * len(self.positions)
+
+    # ====================
+    @property
+    def x(self) -> LazyTexts:
+
+        return LazyTexts(self.df, list(self.cols_to_classes.keys()), self.positions)
+
+    # ====================
+    @property
+    def y(self) -> pd.Series:
+
+        classes = list(self.cols_to_classes.values())
+        categories = list(dict.fromkeys(classes))
+        codes = np.repeat(
+            [categories.index(class_) for class_ in classes], len(self.positions)
+        )
+        return pd.Series(
+            pd.Categorical.from_codes(codes, categories=categories), name='y'
+        )
+
+    # ====================
+    def __getitem__(self, col: str):
+
+        if col == 'x':
+            return self.x
+        if col == 'y':
+            return self.y
+        for old_col, new_col in self.cols_to_keep.items():
+            if new_col == col:
+                values = self.df[old_col].to_numpy()[self.positions]
+                return pd.Series(np.tile(values, len(self.cols_to_classes)), name=col)
+        raise KeyError(col)
+
+    # ====================
+    def to_frame(self) -> pd.DataFrame:
+        """Materialize the view as a DataFrame.
+
+        Returns:
+          pd.DataFrame:
+            The same DataFrame as returned by paras_df_to_xy_df, except that
+            the 'y' column is categorical.
+        """
+
+        data = {col: self[col].to_numpy() for col in self.cols_to_keep.values()}
+        data['x'] = self.x.to_list()
+        data['y'] = self.y
+        return pd.DataFrame(data)
@@ -11,6 +11,11 @@ REQUIREMENTS = [
     'spacy'
 ]
 
+EXTRAS = {
+    'arrow': ['pyarrow'],
+    'test': ['pytest']
+}
+
 setup(
     name='pe_detection',
     version='0.0141',
@@ -25,5 +30,6 @@ Tools for PE detection work.
         'pe_detection.learn',
         'pe_detection.preprocessing'
     ],
-    install_requires=REQUIREMENTS
+    install_requires=REQUIREMENTS,
+    extras_require=EXTRAS
 )
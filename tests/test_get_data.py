@@ -0,0 +1,138 @@
+"""Tests for get_data.get_posteditese_mtsummit19_data against a local HTTP
+server that stands in for GitHub, serving a directory page in the format
+get_github_dirlist parses and the raw files it links to."""
+
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+from pe_detection.tools.get_data import get_posteditese_mtsummit19_data
+
+DATASET = 'wit3'
+FILES = {
+    'ted.en-de.ht.de.norm': ['Das ist ein Satz .', 'Noch einer &amp; mehr', 'Ende'],
+    'ted.en-de.nmt1.de.norm': ['Dies ist ein Satz .', 'Noch einer & mehr', 'Ende'],
+    'ted.en-de.src.en.norm': ['This is a sentence .', 'Another one & more', 'End'],
+}
+DIRS = ['IWSLT16-HE-RELEASE']
+
+
+# ====================
+def dir_page(files: list, dirs: list) -> str:
+    """Get a directory page with the link classes and icon labels of a GitHub
+    tree page."""
+
+    rows = [
+        f'<div><svg aria-label="{label}"></svg>' + \
+        f'<a class="js-navigation-open Link--primary" href="#">{name}</a></div>'
+        for label, names in [('Directory', dirs), ('File', files)]
+        for name in names
+    ]
+    return f"<html><body>{''.join(rows)}</body></html>"
+
+
+# ====================
+class FakeGitHub:
+    """The state of the local server: the content served at each path, the
+    number of times each path was requested, and the number of times each
+    path should fail with a 503 before succeeding."""
+
+    def __init__(self, files: dict):
+
+        self.routes = {
+            f'/datasets/{DATASET}': dir_page(list(files), DIRS).encode('utf-8')
+        }
+        for name, lines in files.items():
+            self.routes[f'/datasets/{DATASET}/{name}'] = \
+                '\n'.join(lines).encode('utf-8') + b'\n'
+        self.requests = Counter()
+        self.failures = Counter()
+        self.lock = threading.Lock()
+
+
+# ====================
+@pytest.fixture
+def server():
+
+    state = FakeGitHub(FILES)
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+
+            with state.lock:
+                state.requests[self.path] += 1
+                fail = state.failures[self.path] > 0
+                if fail:
+                    state.failures[self.path] -= 1
+            if fail:
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            elif self.path in state.routes:
+                body = state.routes[self.path]
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        def log_message(self, *args):
+
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    base_url = f'http://127.0.0.1:{httpd.server_address[1]}/datasets/'
+    yield base_url, state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+# ====================
+def test_concurrent_fetch_matches_serial(server):
+
+    base_url, _ = server
+    serial = get_posteditese_mtsummit19_data(
+        DATASET, base_url=base_url, max_workers=1, backoff_factor=0
+    )
+    concurrent = get_posteditese_mtsummit19_data(
+        DATASET, base_url=base_url, max_workers=8, backoff_factor=0
+    )
+    pd.testing.assert_frame_equal(serial, concurrent)
+    # Directories are skipped and HTML entities are unescaped
+    expected = pd.DataFrame(FILES)
+    expected.loc[1, 'ted.en-de.ht.de.norm'] = 'Noch einer & mehr'
+    pd.testing.assert_frame_equal(serial, expected)
+
+
+# ====================
+def test_failed_request_is_retried(server):
+
+    base_url, state = server
+    path = f'/datasets/{DATASET}/ted.en-de.nmt1.de.norm'
+    state.failures[path] = 2
+    df = get_posteditese_mtsummit19_data(
+        DATASET, base_url=base_url, retries=3, backoff_factor=0
+    )
+    assert state.requests[path] == 3
+    assert df['ted.en-de.nmt1.de.norm'].to_list() == FILES['ted.en-de.nmt1.de.norm']
+
+
+# ====================
+def test_mismatched_line_counts_raise(server):
+
+    base_url, state = server
+    state.routes[f'/datasets/{DATASET}/ted.en-de.src.en.norm'] = b'Only one line\n'
+    with pytest.raises(RuntimeError, match='Number of lines'):
+        get_posteditese_mtsummit19_data(
+            DATASET, base_url=base_url, backoff_factor=0
+        )